@@ -15,19 +15,25 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import asyncio
 import ctypes as ct
+import mmap as _mmap
 import numpy as np
+import os
+import queue
+import threading
+import weakref
+from collections import OrderedDict
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from enum import IntEnum
+from fnmatch import fnmatchcase
+from functools import partial
+from itertools import product, repeat
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
 from .loadlib import sdf_lib
 
-#try:
-#    import xarray as xr
-#
-#    got_xarray = True
-#except ImportError:
-#    print("WARNING: xarray not installed. Generating plain numpy arrays.")
-#    got_xarray = False
-
 
 # Enum representation using ct
 class SdfBlockType(IntEnum):
@@ -94,6 +100,14 @@ _np_datatypes = [0, np.int32, np.int64, np.float32, np.float64, \
                  np.longdouble, np.byte, np.int32, bool, 0]
 _ct_datatypes = [0, ct.c_int32, ct.c_int64, ct.c_float, ct.c_double, \
                  ct.c_longdouble, ct.c_char, ct.c_bool, 0]
+# Datatypes which can be read straight from the file with NumPy
+_direct_datatypes = (SdfDataType.SDF_DATATYPE_INTEGER4,
+                     SdfDataType.SDF_DATATYPE_INTEGER8,
+                     SdfDataType.SDF_DATATYPE_REAL4,
+                     SdfDataType.SDF_DATATYPE_REAL8)
+
+# Number of elements converted at a time when reading with a type change
+_CHUNK_SIZE = 1 << 20
 
 # Constants
 SDF_READ = 1
@@ -304,9 +318,20 @@ class RunInfo(ct.Structure):
     ]
 
 
-class BlockList:
-    """Contains all the blocks"""
-    def __init__(self, filename, convert=False, derived=True):
+class BlockList(Mapping):
+    """Contains all the blocks
+
+    Blocks are available as attributes named after the block names, and
+    through the mapping interface by their original name or id, e.g.
+    ``bl["Electric Field/Ex"]`` or ``bl.by_id["ex"]``.
+    """
+    # Compare and hash by identity rather than by contents, as before
+    # BlockList was a Mapping
+    __eq__ = object.__eq__
+    __hash__ = object.__hash__
+
+    def __init__(self, filename, convert=False, derived=True, variables=None,
+                 mmap=False):
         clib = sdf_lib
         self._clib = clib
         clib.sdf_open.restype = ct.POINTER(SdfFile)
@@ -326,7 +351,18 @@ class BlockList:
         if convert:
             h.contents.use_float = True
 
+        self.Header = _get_header(h, filename)
         h._clib = clib
+        h._filename = filename
+        h._convert = convert
+        h._derived = derived
+        h._closed = False
+        h._nbuffers = 0
+        h._lock = threading.RLock()
+        h._mmap = None
+        if mmap:
+            with open(filename, 'rb') as f:
+                h._mmap = _mmap.mmap(f.fileno(), 0, access=_mmap.ACCESS_READ)
         self._handle = h
         clib.sdf_stack_init(h)
         if derived:
@@ -335,50 +371,228 @@ class BlockList:
             clib.sdf_read_blocklist(h)
 
 
+        blocks = []
         block = h.contents.blocklist
-        meshes = []
-        mesh_vars = []
         for n in range(h.contents.nblocks):
             block = block.contents
             block._handle = h
+            blocks.append(block)
+            block = block.next
+
+        if variables is not None:
+            blocks = _select_blocks(blocks, variables)
+
+        # Wrappers are only built when a block is first accessed
+        self._table = {}
+        self._name_ids = {}
+        self._members = {}
+        self._wrappers = {}
+        for block in blocks:
             blocktype = block.blocktype
-            name = get_member_name(block.name)
             if blocktype == SdfBlockType.SDF_BLOCKTYPE_RUN_INFO:
                 self.Run_info = get_run_info(block)
-            elif blocktype == SdfBlockType.SDF_BLOCKTYPE_CONSTANT:
-                self.__dict__[name] = BlockConstant(block)
-            elif blocktype == SdfBlockType.SDF_BLOCKTYPE_PLAIN_VARIABLE:
-                self.__dict__[name] = BlockPlainVariable(block)
-                mesh_vars.append(self.__dict__[name])
-            elif blocktype == SdfBlockType.SDF_BLOCKTYPE_POINT_VARIABLE:
-                self.__dict__[name] = BlockPointVariable(block)
-                mesh_vars.append(self.__dict__[name])
-            elif blocktype == SdfBlockType.SDF_BLOCKTYPE_PLAIN_MESH:
-                self.__dict__[name] = BlockPlainMesh(block)
-                meshes.append(self.__dict__[name])
-            elif blocktype == SdfBlockType.SDF_BLOCKTYPE_POINT_MESH:
-                self.__dict__[name] = BlockPointMesh(block)
-                meshes.append(self.__dict__[name])
-            elif blocktype == SdfBlockType.SDF_BLOCKTYPE_NAMEVALUE:
-                self.__dict__[name] = BlockNameValue(block)
-            elif blocktype == SdfBlockType.SDF_BLOCKTYPE_ARRAY:
-                self.__dict__[name] = BlockArray(block)
-            #else:
-            #    print(name,SdfBlockType(blocktype).name)
-            block = block.next
+            elif blocktype in _block_types:
+                bid = block.id.decode()
+                name = block.name.decode()
+                self._table[bid] = (name, blocktype, block)
+                self._name_ids[name] = bid
+                self._members[get_member_name(block.name)] = bid
+
+    def _block(self, bid):
+        """Returns the block with the given id, creating it if necessary"""
+        b = self._wrappers.get(bid)
+        if b is None:
+            if self.closed:
+                raise ValueError(f"I/O operation on closed SDF file "
+                                 f"'{self._handle._filename}'")
+            name, blocktype, block = self._table[bid]
+            b = _block_types[blocktype](block)
+            if isinstance(b, BlockPlainVariable):
+                gid = b.grid_id
+                b._grid = self._block(gid) if gid in self._table else None
+            self._wrappers[bid] = b
+            self.__dict__[get_member_name(block.name)] = b
+        return b
+
+    def __getattr__(self, attr):
+        members = self.__dict__.get('_members')
+        if members is None or attr.startswith('__'):
+            raise AttributeError(attr)
+        if attr not in members:
+            raise AttributeError(f"'{type(self).__name__}' object has no "
+                                 f"attribute '{attr}'")
+        return self._block(members[attr])
+
+    def __dir__(self):
+        return list(super().__dir__()) + list(self._members)
+
+    def __getitem__(self, key):
+        """Returns a block by its name, or by its id"""
+        if key in self._name_ids:
+            return self._block(self._name_ids[key])
+        if key in self._table:
+            return self._block(key)
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(self._name_ids)
+
+    def __len__(self):
+        return len(self._name_ids)
+
+    @property
+    def by_id(self):
+        """Blocks indexed by id"""
+        return _BlockIndex(self._table, self._block)
 
-        for var in mesh_vars:
-            gid = var.grid_id
-            for mesh in meshes:
-                if mesh.id == gid:
-                    var._grid = mesh
-                    break
+    @property
+    def by_name(self):
+        """Blocks indexed by name"""
+        return _BlockIndex(self._name_ids,
+                           lambda name: self._block(self._name_ids[name]))
+
+    def load(self, names, workers=None, dtype=None):
+        """Loads the data of several blocks concurrently.
+
+        Blocks whose data is a plain array in the file are read in parallel
+        by a pool of threads, each using its own file descriptor. Other
+        blocks are read one at a time through the shared C file handle.
+
+        Parameters
+        ----------
+        names : string or list of strings
+            Names or ids of the blocks to load.
+        workers : int, optional
+            Number of threads to use. Defaults to the
+            ``ThreadPoolExecutor`` default.
+        dtype : data-type or dict, optional
+            Type to convert the data to while reading, either for all
+            blocks or as a dictionary keyed by the given names.
+
+        Returns
+        -------
+        dict
+            The data of each block, keyed by the given names.
+        """
+        if isinstance(names, str):
+            names = [names]
+        if not isinstance(dtype, dict):
+            dtype = dict.fromkeys(names, dtype)
+        blocks = [self[name] for name in names]
+        with ThreadPoolExecutor(workers) as pool:
+            data = list(pool.map(lambda b, n: b.load(dtype.get(n)),
+                                 blocks, names))
+        return dict(zip(names, data))
+
+    def share(self, names):
+        """Copies the data of several blocks into shared memory.
+
+        See :meth:`BlockPlainVariable.to_shared_memory`. The shared memory
+        blocks belong to the caller and outlive the ``BlockList``, so the
+        caller must call :meth:`SharedBlock.unlink` on each of them once
+        the workers have finished.
+
+        Parameters
+        ----------
+        names : string or list of strings
+            Names or ids of the blocks to share.
+
+        Returns
+        -------
+        dict
+            A :class:`SharedBlock` for each block, or a tuple of them with
+            one for each component of a mesh, keyed by the given names.
+        """
+        if isinstance(names, str):
+            names = [names]
+        shared = {}
+        try:
+            for name in names:
+                shared[name] = self[name].to_shared_memory()
+        except BaseException:
+            for block in shared.values():
+                block.unlink()
+            raise
+        return shared
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
     def __del__(self):
-        self._clib.sdf_stack_destroy.argtypes = [ct.c_void_p]
-        self._clib.sdf_close.argtypes = [ct.c_void_p]
-        self._clib.sdf_stack_destroy(self._handle)
-        self._clib.sdf_close(self._handle)
+        self.close()
+
+    @property
+    def closed(self):
+        """True if the file has been closed"""
+        return self._handle._closed
+
+    def close(self):
+        """Closes the file and frees the data of all blocks.
+
+        Arrays already returned by a block remain valid. The C buffers they
+        use, and the file handle, are freed once the last of them has been
+        deleted. Loading block data after closing raises ``ValueError``.
+        """
+        h = getattr(self, '_handle', None)
+        if h is None or h._closed:
+            return
+        for b in getattr(self, '_wrappers', {}).values():
+            b.release()
+        h._closed = True
+        h._mmap = None
+        if h._nbuffers == 0:
+            _close_handle(h)
+
+
+class _BlockIndex(Mapping):
+    """Read-only view of the blocks in a BlockList"""
+    def __init__(self, keys, get):
+        self._keys = keys
+        self._get = get
+
+    def __getitem__(self, key):
+        if key not in self._keys:
+            raise KeyError(key)
+        return self._get(key)
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+
+def _close_handle(h):
+    """Frees the C file handle"""
+    clib = h._clib
+    clib.sdf_stack_destroy.argtypes = [ct.c_void_p]
+    clib.sdf_close.argtypes = [ct.c_void_p]
+    clib.sdf_stack_destroy(h)
+    clib.sdf_close(h)
+
+
+class _BlockBuffer:
+    """Owns the C data buffer of a block.
+
+    Every array wrapping the buffer holds a reference to its owner, so the
+    buffer is only freed once the block and all arrays handed out from it
+    have released it.
+    """
+    def __init__(self, handle, block):
+        self._handle = handle
+        self._block = block
+        handle._nbuffers += 1
+
+    def __del__(self):
+        h = self._handle
+        with h._lock:
+            h._clib.sdf_free_block_data(h, self._block)
+            h._nbuffers -= 1
+            if h._closed and h._nbuffers == 0:
+                _close_handle(h)
 
 
 class Block:
@@ -386,6 +600,9 @@ class Block:
     Contains the data and metadata for a single
     block from an SDF file.
     """
+    # Whether the data is loaded from the file on first access
+    _lazy = False
+
     def __init__(self, block):
         self._handle = block._handle
         self._id = block.id.decode()
@@ -393,26 +610,211 @@ class Block:
         self._datatype = _np_datatypes[block.datatype_out]
         self._data_length = block.data_length
         self._dims = tuple(block.dims[:block.ndims])
+        # Metadata is copied, since the C block is freed when the file is
+        # closed. The C block is only used while the file is open.
+        self._file_datatype = block.datatype
+        self._swap = bool(block._handle.contents.swap)
+        self._data_location = block.data_location
+        self._direct = bool(block.in_file) and not block.derived \
+            and block.data_location > 0 and block.datatype in _direct_datatypes
         self._contents = block
-        self._owndata = True
-
-    def __del__(self):
-        if not self._owndata and self._data is not None:
-            clib = self._handle._clib
-            clib.sdf_free_block_data(self._handle, self._contents)
+        self._buffer = None
 
     def _numpy_from_buffer(self, data, blen):
-        buffer_from_memory = ct.pythonapi.PyMemoryView_FromMemory
-        buffer_from_memory.restype = ct.py_object
         dtype = self._datatype
         if dtype == np.byte:
             dtype = np.dtype('|S1')
-        totype = _ct_datatypes[self._contents.datatype]
-        cast = ct.cast(data, ct.POINTER(totype))
-        buf = buffer_from_memory(cast, blen)
-        self._owndata = False
+        if blen == 0:
+            return np.empty(0, dtype)
+        owner = self._buffer() if self._buffer is not None else None
+        if owner is None:
+            owner = _BlockBuffer(self._handle, self._contents)
+            self._buffer = weakref.ref(owner)
+        buf = (ct.c_byte * blen).from_address(data)
+        buf._owner = owner
         return np.frombuffer(buf, dtype)
 
+    def _check_open(self):
+        if self._handle._closed:
+            raise ValueError(f"I/O operation on closed SDF file "
+                             f"'{self._handle._filename}'")
+
+    def release(self):
+        """Releases the block data.
+
+        Arrays already returned by :attr:`data` remain valid and the C
+        buffer is freed once the last of them has been deleted. The data is
+        read again from the file on the next access.
+        """
+        if self._lazy:
+            self._data = None
+            block_cache._discard(self)
+
+    def _file_dtype(self):
+        """NumPy type of the data as stored in the file"""
+        dtype = np.dtype(_np_datatypes[self._file_datatype])
+        if self._swap:
+            dtype = dtype.newbyteorder()
+        return dtype
+
+    def _in_file(self):
+        """Whether the block data is a plain array stored in the file
+        which can be read directly, without going through the C library
+        """
+        return self._direct
+
+    def _mappable(self):
+        """Whether the block data can be used straight from the memory
+        mapped file, without conversion
+        """
+        return self._handle._mmap is not None and self._in_file() \
+            and self._file_dtype() == np.dtype(self._datatype)
+
+    def _map_file(self, shape, offset=0):
+        """Read-only memory map of the block data in the file"""
+        mm = self._handle._mmap
+        if mm is not None:
+            return np.ndarray(shape, dtype=self._file_dtype(), buffer=mm,
+                              offset=self._data_location + offset,
+                              order='F')
+        return np.memmap(self._handle._filename, dtype=self._file_dtype(),
+                         mode='r', offset=self._data_location + offset,
+                         shape=shape, order='F')
+
+    def _read_file(self, shape, offset=0):
+        """Reads the block data directly from the file into a new array"""
+        array = np.fromfile(self._handle._filename, dtype=self._file_dtype(),
+                            count=int(np.prod(shape)),
+                            offset=self._data_location + offset)
+        return array.reshape(shape, order='F').astype(self._datatype,
+                                                      copy=False)
+
+    def _load(self):
+        """Loads the block data.
+
+        Plain arrays stored in the file are read without going through the
+        shared C file handle, so that several blocks can be loaded at once.
+        """
+        if self._lazy and self._data is None and self._in_file() \
+                and not self._mappable():
+            self._check_open()
+            self._data = self._read_direct()
+        return self.data
+
+    def _out_array(self, out, dtype):
+        """Checks a caller-provided buffer against the block and returns it
+        as a flat array
+        """
+        dtype = np.dtype(dtype)
+        count = int(np.prod(self.dims))
+        if isinstance(out, np.ndarray):
+            if out.dtype != dtype:
+                raise TypeError(f"Buffer has type {out.dtype}, "
+                                f"expected {dtype}")
+            if not out.flags.writeable:
+                raise ValueError("Buffer is read-only")
+            if out.shape == self.dims and out.flags.f_contiguous:
+                return out.reshape(-1, order='F')
+            if out.ndim == 1 and out.size == count and out.flags.c_contiguous:
+                return out
+            raise ValueError(f"Buffer must be a Fortran-ordered array of "
+                             f"shape {self.dims} or a flat array of "
+                             f"{count} elements")
+        flat = np.frombuffer(out, dtype=dtype, count=count)
+        if not flat.flags.writeable:
+            raise ValueError("Buffer is read-only")
+        return flat
+
+    def _fill(self, flat):
+        """Reads the block data into a flat array, converting the type in
+        chunks if necessary
+        """
+        if self._data is not None or not self._in_file():
+            cached = self._data is not None
+            flat[...] = self.data.reshape(-1, order='F')
+            if not cached:
+                # Only the copy in the caller's buffer is kept
+                self.release()
+            return
+        self._check_open()
+        if self._file_dtype() == flat.dtype:
+            view = memoryview(flat).cast('B')
+            with open(self._handle._filename, 'rb') as f:
+                f.seek(self._data_location)
+                pos = 0
+                while pos < len(view):
+                    n = f.readinto(view[pos:])
+                    if not n:
+                        raise EOFError(f"Unexpected end of file reading "
+                                       f"block '{self.id}'")
+                    pos += n
+            return
+        start = 0
+        for chunk in self._iter_file(_CHUNK_SIZE, flat.size):
+            flat[start:start+len(chunk)] = chunk
+            start += len(chunk)
+
+    def _load_as(self, dtype):
+        """Reads the block data, converting it to the given type"""
+        flat = np.empty(int(np.prod(self.dims)), dtype)
+        self._fill(flat)
+        return flat.reshape(self.dims, order='F')
+
+    def load(self, dtype=None):
+        """Loads the block data, optionally converting its type.
+
+        Data stored as a plain array in the file is converted in chunks
+        while it is read, so a copy of the data in the original type is
+        never held in memory. Other data, such as derived blocks, is read
+        whole by the C library and converted afterwards, without being
+        kept in the original type. Constants and name-value blocks are
+        converted from the values already read. The converted data is
+        returned without being kept by the block, so :attr:`data` and
+        :attr:`datatype` are unchanged.
+
+        Parameters
+        ----------
+        dtype : data-type, optional
+            Type to convert the data to.
+
+        Returns
+        -------
+        The block data.
+        """
+        if dtype is None:
+            return self._load()
+        if self._lazy:
+            self._check_open()
+        return self._load_as(np.dtype(dtype))
+
+    async def aload(self, dtype=None, executor=None):
+        """Loads the block data without blocking the event loop.
+
+        Parameters
+        ----------
+        dtype : data-type, optional
+            Type to convert the data to, as for :meth:`load`.
+        executor : concurrent.futures.Executor, optional
+            The executor to read the data in, which also limits the number
+            of concurrent reads. Defaults to a thread pool shared by all
+            asynchronous reads.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor or _get_executor(),
+                                          partial(self.load, dtype))
+
+    def _iter_file(self, n, count, offset=0):
+        """Reads ``count`` elements of the block data sequentially from the
+        file, yielding them in chunks of at most ``n`` elements
+        """
+        self._check_open()
+        dtype = self._file_dtype()
+        with open(self._handle._filename, 'rb') as f:
+            f.seek(self._data_location + offset)
+            for start in range(0, count, n):
+                chunk = np.fromfile(f, dtype=dtype, count=min(n, count - start))
+                yield chunk.astype(self._datatype, copy=False)
+
     @property
     def data(self):
         """Block data contents"""
@@ -445,6 +847,55 @@ class Block:
 
 
 
+class _ArrayIO:
+    """Reading of a block holding a single array into caller or shared
+    memory, for blocks derived from :class:`Block`
+    """
+    def read_into(self, out):
+        """Reads the block data into an existing buffer.
+
+        No new array is allocated, so a single buffer can be reused for
+        the same block across many files.
+
+        Parameters
+        ----------
+        out : ndarray or writable buffer
+            A writable array of shape :attr:`dims` in Fortran order, a flat
+            contiguous array, or any writable buffer such as a
+            ``multiprocessing.shared_memory`` block or a memory map. Its
+            type must be :attr:`datatype`.
+
+        Returns
+        -------
+        ndarray
+            A view of ``out`` with the shape of the block.
+        """
+        flat = self._out_array(out, self._datatype)
+        self._fill(flat)
+        return flat.reshape(self.dims, order='F')
+
+    def to_shared_memory(self):
+        """Copies the block data into a new shared memory block.
+
+        The data is read straight into shared memory. The returned
+        :class:`SharedBlock` can be pickled and sent to worker processes,
+        which attach to it as a zero-copy array, so one read serves every
+        worker. The caller must call :meth:`SharedBlock.unlink` once the
+        workers have finished.
+
+        Returns
+        -------
+        SharedBlock
+        """
+        shared, shm = _create_shared(self.dims, self._datatype, self.name)
+        try:
+            self.read_into(shm.buf)
+        except BaseException:
+            shared.unlink()
+            raise
+        return shared
+
+
 class BlockConstant(Block):
     """Constant block class"""
     def __init__(self, block):
@@ -454,24 +905,80 @@ class BlockConstant(Block):
         totype = _ct_datatypes[block.datatype]
         self._data = totype.from_buffer(block, offset).value
 
+    def _load_as(self, dtype):
+        return dtype.type(self._data)
+
+
+class BlockPlainVariable(_ArrayIO, Block):
+    _lazy = True
 
-class BlockPlainVariable(Block):
     def __init__(self, block):
         super().__init__(block)
         self._data = None
+        self._grid_id = block.mesh_id
+        self._mult = block.mult
+        self._stagger = block.stagger
+        self._units = block.units
 
     @property
     def data(self):
         """Block data contents"""
         if self._data is None:
+            self._check_open()
+        if self._data is None and self._mappable():
+            self._data = self._map_file(self.dims)
+        elif self._data is None:
             clib = self._handle._clib
-            clib.sdf_helper_read_data(self._handle, self._contents)
-            blen = np.dtype(self._datatype).itemsize
-            for d in self.dims:
-                blen *= d
-            array = self._numpy_from_buffer(self._contents.data, blen)
+            with self._handle._lock:
+                clib.sdf_helper_read_data(self._handle, self._contents)
+                blen = np.dtype(self._datatype).itemsize
+                for d in self.dims:
+                    blen *= d
+                array = self._numpy_from_buffer(self._contents.data, blen)
             self._data = array.reshape(self.dims, order='F')
-        return self._data
+        data = self._data
+        block_cache._access(self)
+        return data
+
+    def _read_direct(self):
+        return self._read_file(self.dims)
+
+    def read(self, key=Ellipsis):
+        """Reads a region of the block data.
+
+        Only the part of the file covered by the region is read, so a small
+        sub-box of a large array can be extracted without loading the whole
+        block. ``var.read(key)`` is equivalent to ``var[key]``.
+
+        Parameters
+        ----------
+        key : int, slice or tuple of ints and slices, optional
+            NumPy-style index into the block data.
+        """
+        if self._data is not None or not self._in_file():
+            return self.data[key]
+        self._check_open()
+        array = self._map_file(self.dims)
+        return np.array(array[key], dtype=self._datatype)
+
+    def __getitem__(self, key):
+        return self.read(key)
+
+    def to_dask(self, chunks='auto'):
+        """Returns the block data as a lazy dask array.
+
+        Each chunk is read by an independent task which reopens the file
+        and reads only its own region, so the graph can be run by any
+        dask scheduler, including a distributed cluster.
+
+        Parameters
+        ----------
+        chunks : int, tuple or str, optional
+            Chunk shape, in any form accepted by ``dask.array``.
+        """
+        h = self._handle
+        return _dask_array(h._filename, self.id, self.dims, self._datatype,
+                           chunks, h._convert, h._derived)
 
     @property
     def grid(self):
@@ -481,25 +988,27 @@ class BlockPlainVariable(Block):
     @property
     def grid_id(self):
         """Associated mesh id"""
-        return self._contents.mesh_id.decode()
+        return self._grid_id.decode()
 
     @property
     def mult(self):
         """Multiplication factor"""
-        return self._contents.mult
+        return self._mult
 
     @property
     def stagger(self):
         """Grid stagger"""
-        return SdfStagger(self._contents.stagger)
+        return SdfStagger(self._stagger)
 
     @property
     def units(self):
         """Units of variable"""
-        return self._contents.units.decode()
+        return self._units.decode()
 
 
 class BlockPlainMesh(Block):
+    _lazy = True
+
     def __init__(self, block):
         super().__init__(block)
         self._data = None
@@ -509,20 +1018,102 @@ class BlockPlainMesh(Block):
         if bool(block.dim_mults):
             self._mult = tuple(block.dim_mults[:block.ndims])
         self._extents = tuple(block.extents[:2*block.ndims])
+        self._geometry = block.geometry
 
     @property
     def data(self):
         """Block data contents"""
         if self._data is None:
+            self._check_open()
+        if self._data is None and self._mappable():
+            grids = []
+            offset = 0
+            for d in self.dims:
+                grids.append(self._map_file((d,), offset))
+                offset += d * np.dtype(self._datatype).itemsize
+            self._data = tuple(grids)
+        elif self._data is None:
             clib = self._handle._clib
-            clib.sdf_helper_read_data(self._handle, self._contents)
             grids = []
-            for i, d in enumerate(self.dims):
-                blen = np.dtype(self._datatype).itemsize * d
-                array = self._numpy_from_buffer(self._contents.grids[i], blen)
-                grids.append(array)
+            with self._handle._lock:
+                clib.sdf_helper_read_data(self._handle, self._contents)
+                for i, d in enumerate(self.dims):
+                    blen = np.dtype(self._datatype).itemsize * d
+                    array = self._numpy_from_buffer(self._contents.grids[i],
+                                                    blen)
+                    grids.append(array)
             self._data = tuple(grids)
-        return self._data
+        data = self._data
+        block_cache._access(self)
+        return data
+
+    def _read_direct(self):
+        grids = []
+        offset = 0
+        for d in self.dims:
+            grids.append(self._read_file((d,), offset))
+            offset += d * self._file_dtype().itemsize
+        return tuple(grids)
+
+    def _load_as(self, dtype):
+        if self._data is not None or not self._in_file():
+            cached = self._data is not None
+            grids = tuple(grid.astype(dtype) for grid in self.data)
+            if not cached:
+                self.release()
+            return grids
+        grids = []
+        offset = 0
+        for d in self.dims:
+            grid = np.empty(d, dtype)
+            self._fill_grid(grid, offset)
+            grids.append(grid)
+            offset += d * self._file_dtype().itemsize
+        return tuple(grids)
+
+    def _fill_grid(self, out, offset):
+        """Reads one component from the file, converting its type in
+        chunks if necessary
+        """
+        start = 0
+        for chunk in self._iter_file(_CHUNK_SIZE, len(out), offset):
+            out[start:start+len(chunk)] = chunk
+            start += len(chunk)
+
+    def to_shared_memory(self):
+        """Copies the mesh data into shared memory, with a shared memory
+        block for each component.
+
+        See :meth:`BlockPlainVariable.to_shared_memory`. Each component,
+        such as the x, y and z positions of the particles of a point mesh,
+        is read straight into its own block.
+
+        Returns
+        -------
+        tuple of SharedBlock
+            One for each component.
+        """
+        data = None
+        if self._data is not None or not self._in_file():
+            data = self.data
+        shared = []
+        offset = 0
+        try:
+            for i, d in enumerate(self.dims):
+                block, shm = _create_shared((d,), self._datatype, self.name)
+                shared.append(block)
+                out = np.ndarray((d,), self._datatype, buffer=shm.buf)
+                if data is not None:
+                    out[...] = data[i]
+                else:
+                    self._fill_grid(out, offset)
+                del out
+                offset += d * self._file_dtype().itemsize
+        except BaseException:
+            for block in shared:
+                block.unlink()
+            raise
+        return tuple(shared)
 
     @property
     def extents(self):
@@ -532,7 +1123,7 @@ class BlockPlainMesh(Block):
     @property
     def geometry(self):
         """Domain geometry"""
-        return SdfGeometry(self._contents.geometry)
+        return SdfGeometry(self._geometry)
 
     @property
     def labels(self):
@@ -553,21 +1144,115 @@ class BlockPlainMesh(Block):
 class BlockPointMesh(BlockPlainMesh):
     def __init__(self, block):
         super().__init__(block)
+        self._species_id = block.material_id
+
+    def read(self, key=Ellipsis, stride=None):
+        """Reads a subset of the particle positions.
+
+        Only the selected particles are copied from the file, so memory use
+        scales with the size of the subset rather than the particle count.
+        Using the same ``key`` or ``stride`` for the mesh and its point
+        variables keeps the positions and variables aligned.
+
+        Parameters
+        ----------
+        key : int or slice, optional
+            NumPy-style index into the particle arrays.
+        stride : int, optional
+            Only read every ``stride``-th particle.
+
+        Returns
+        -------
+        tuple of ndarray
+            One array for each spatial component.
+        """
+        key = _stride_key(key, stride)
+        if self._data is not None or not self._in_file():
+            return tuple(grid[key] for grid in self.data)
+        self._check_open()
+        npart = self.dims[0]
+        itemsize = self._file_dtype().itemsize
+        grids = []
+        for i in range(len(self.dims)):
+            array = self._map_file((npart,), i * npart * itemsize)
+            grids.append(np.array(array[key], dtype=self._datatype))
+        return tuple(grids)
+
+    def __getitem__(self, key):
+        return self.read(key)
+
+    def _chunks(self, n):
+        npart = self.dims[0]
+        if self._data is not None or not self._in_file():
+            for start in range(0, npart, n):
+                yield tuple(grid[start:start+n] for grid in self.data)
+            return
+        itemsize = self._file_dtype().itemsize
+        readers = [self._iter_file(n, npart, i * npart * itemsize)
+                   for i in range(len(self.dims))]
+        yield from zip(*readers)
+
+    def iter_chunks(self, n, *others):
+        """Iterates over the particle positions in chunks of ``n`` particles.
+
+        See :func:`iter_chunks`. Each chunk is a tuple with one array for
+        each spatial component.
+        """
+        if others:
+            return iter_chunks((self,) + others, n)
+        return self._chunks(n)
 
     @property
     def species_id(self):
         """Species ID"""
-        return self._contents.material_id.decode()
+        return self._species_id.decode()
 
 
 class BlockPointVariable(BlockPlainVariable):
     def __init__(self, block):
         super().__init__(block)
+        self._species_id = block.material_id
+
+    def read(self, key=Ellipsis, stride=None):
+        """Reads a subset of the particle data.
+
+        Only the selected particles are copied from the file, so memory use
+        scales with the size of the subset rather than the particle count.
+        Using the same ``key`` or ``stride`` for the variable and its mesh
+        keeps the positions and variables aligned.
+
+        Parameters
+        ----------
+        key : int or slice, optional
+            NumPy-style index into the particle array.
+        stride : int, optional
+            Only read every ``stride``-th particle.
+        """
+        return super().read(_stride_key(key, stride))
+
+    def _chunks(self, n):
+        npart = self.dims[0]
+        if self._data is not None or not self._in_file():
+            for start in range(0, npart, n):
+                yield self.data[start:start+n]
+            return
+        yield from self._iter_file(n, npart)
+
+    def iter_chunks(self, n, *others):
+        """Iterates over the particle data in chunks of ``n`` particles.
+
+        See :func:`iter_chunks`. If other point variables or meshes of the
+        same species are given, each chunk is a tuple containing the
+        matching rows of every block.
+        """
+        if others:
+            return iter_chunks((self,) + others, n)
+        return self._chunks(n)
 
     @property
     def species_id(self):
         """Species ID"""
-        return self._contents.material_id.decode()
+        return self._species_id.decode()
 
 
 class BlockNameValue(Block):
@@ -588,8 +1273,13 @@ class BlockNameValue(Block):
             self.__dict__[nid] = val
         self._data = vals
 
+    def _load_as(self, dtype):
+        return {nid: dtype.type(val) for nid, val in self._data.items()}
+
+
+class BlockArray(_ArrayIO, Block):
+    _lazy = True
 
-class BlockArray(Block):
     def __init__(self, block):
         super().__init__(block)
         self._data = None
@@ -598,14 +1288,295 @@ class BlockArray(Block):
     def data(self):
         """Block data contents"""
         if self._data is None:
+            self._check_open()
+        if self._data is None and self._mappable():
+            self._data = self._map_file(self.dims)
+        elif self._data is None:
             clib = self._handle._clib
-            clib.sdf_helper_read_data(self._handle, self._contents)
-            blen = np.dtype(self._datatype).itemsize
-            for d in self.dims:
-                blen *= d
-            array = self._numpy_from_buffer(self._contents.data, blen)
+            with self._handle._lock:
+                clib.sdf_helper_read_data(self._handle, self._contents)
+                blen = np.dtype(self._datatype).itemsize
+                for d in self.dims:
+                    blen *= d
+                array = self._numpy_from_buffer(self._contents.data, blen)
             self._data = array.reshape(self.dims, order='F')
-        return self._data
+        data = self._data
+        block_cache._access(self)
+        return data
+
+    def _read_direct(self):
+        return self._read_file(self.dims)
+
+
+# Shared memory blocks created or attached to by this process
+_shared_segments = {}
+# Names of the shared memory blocks created by this process, which stay
+# registered with its resource tracker until they are unlinked
+_created_segments = set()
+
+def _open_shared_memory(name):
+    try:
+        # Attaching must not register the block with the resource
+        # tracker, which would unlink it when this process exits
+        return SharedMemory(name=name, track=False)
+    except TypeError:
+        # Before Python 3.13 the block is always registered, so undo it
+        shm = SharedMemory(name=name)
+        if os.name == 'posix' and name not in _created_segments:
+            resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+def _create_shared(dims, dtype, name):
+    """Creates a shared memory block for data of the given shape and type,
+    returning its handle and the block itself
+    """
+    dtype = np.dtype(dtype)
+    nbytes = int(np.prod(dims)) * dtype.itemsize
+    shm = SharedMemory(create=True, size=max(nbytes, 1))
+    _shared_segments[shm.name] = shm
+    _created_segments.add(shm.name)
+    return SharedBlock(shm.name, dims, dtype, name), shm
+
+
+class SharedBlock:
+    """Picklable handle to block data in shared memory.
+
+    Created by :meth:`BlockPlainVariable.to_shared_memory`,
+    :meth:`BlockPlainMesh.to_shared_memory` or :meth:`BlockList.share`.
+    Worker processes call :meth:`attach` to get the data as an array
+    backed directly by the shared memory.
+    """
+    def __init__(self, shm_name, dims, dtype, name):
+        self._shm_name = shm_name
+        self._dims = tuple(dims)
+        self._dtype = np.dtype(dtype)
+        self._name = name
+
+    def attach(self):
+        """Returns the data as a zero-copy array.
+
+        The array is valid until :meth:`detach` or :meth:`unlink` is
+        called in this process.
+        """
+        shm = _shared_segments.get(self._shm_name)
+        if shm is None:
+            shm = _open_shared_memory(self._shm_name)
+            _shared_segments[self._shm_name] = shm
+        return np.ndarray(self._dims, dtype=self._dtype, buffer=shm.buf,
+                          order='F')
+
+    def detach(self):
+        """Closes this process's mapping of the shared memory. Arrays
+        returned by :meth:`attach` must no longer be in use.
+        """
+        shm = _shared_segments.pop(self._shm_name, None)
+        if shm is not None:
+            shm.close()
+
+    def unlink(self):
+        """Detaches and destroys the shared memory block"""
+        _created_segments.discard(self._shm_name)
+        shm = _shared_segments.pop(self._shm_name, None)
+        if shm is None:
+            try:
+                shm = SharedMemory(name=self._shm_name)
+            except FileNotFoundError:
+                return
+        try:
+            shm.close()
+        except BufferError:
+            # Arrays attached in this process are still in use, so keep
+            # the mapping until they have gone
+            _shared_segments[self._shm_name] = shm
+        try:
+            shm.unlink()
+        except FileNotFoundError:
+            pass
+
+    @property
+    def dims(self):
+        """Data dimensions"""
+        return self._dims
+
+    @property
+    def datatype(self):
+        """Data type"""
+        return self._dtype
+
+    @property
+    def name(self):
+        """Block name"""
+        return self._name
+
+    @property
+    def shm_name(self):
+        """Name of the shared memory block"""
+        return self._shm_name
+
+
+def _read_region(filename, block_id, key, convert, derived):
+    """Reads a region of a block from a file, for a dask task"""
+    with BlockList(filename, convert, derived, variables=block_id) as bl:
+        return np.asarray(bl.by_id[block_id].read(key))
+
+
+def _dask_array(filename, block_id, dims, dtype, chunks, convert, derived):
+    """Builds a dask array whose chunks are read by independent tasks"""
+    import dask.array as da
+    from dask.array.core import normalize_chunks
+    from dask.base import tokenize
+
+    dtype = np.dtype(dtype)
+    chunks = normalize_chunks(chunks, dims, dtype=dtype)
+    name = "sdfr-" + tokenize(filename, block_id, chunks, convert, derived)
+    starts = [np.cumsum((0,) + c[:-1]) for c in chunks]
+    dsk = {}
+    for index in product(*[range(len(c)) for c in chunks]):
+        key = tuple(slice(int(starts[i][n]), int(starts[i][n]) + chunks[i][n])
+                    for i, n in enumerate(index))
+        dsk[(name,) + index] = (_read_region, filename, block_id, key,
+                                convert, derived)
+    return da.Array(dsk, name, chunks, dtype=dtype)
+
+
+class BlockCache:
+    """Process-wide record of the memory used by loaded block data.
+
+    Every lazily loaded block registers its data on access. When the total
+    size exceeds the budget, the data of the least recently used blocks is
+    released, which frees the C buffers of any that are no longer
+    referenced elsewhere. Released blocks are read again on their next
+    access. Data backed by a memory-mapped file is not counted.
+
+    Parameters
+    ----------
+    budget : int, optional
+        Maximum number of bytes of block data to keep loaded. Unlimited
+        if not given.
+    """
+    def __init__(self, budget=None):
+        self._budget = budget
+        self._entries = OrderedDict()
+        self._nbytes = 0
+        self._lock = threading.RLock()
+
+    @property
+    def budget(self):
+        """Maximum number of bytes of block data to keep loaded"""
+        return self._budget
+
+    @budget.setter
+    def budget(self, budget):
+        self._budget = budget
+        with self._lock:
+            self._evict()
+
+    @property
+    def nbytes(self):
+        """Number of bytes of block data currently loaded"""
+        return self._nbytes
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        """Releases the data of all tracked blocks"""
+        with self._lock:
+            while self._entries:
+                self._pop()
+
+    def _access(self, block):
+        key = id(block)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return
+            if block._mappable():
+                return
+            nbytes = 0
+            data = block._data
+            for array in data if isinstance(data, tuple) else (data,):
+                nbytes += array.nbytes
+            ref = weakref.ref(block, lambda r, key=key: self._forget(key))
+            self._entries[key] = (ref, nbytes)
+            self._nbytes += nbytes
+            self._evict()
+
+    def _discard(self, block):
+        self._forget(id(block))
+
+    def _forget(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._nbytes -= entry[1]
+
+    def _pop(self):
+        key, (ref, nbytes) = self._entries.popitem(last=False)
+        self._nbytes -= nbytes
+        block = ref()
+        if block is not None:
+            block.release()
+
+    def _evict(self):
+        # The most recently used block is always kept
+        if self._budget is None:
+            return
+        while self._nbytes > self._budget and len(self._entries) > 1:
+            self._pop()
+
+
+# Cache shared by all blocks in the process
+block_cache = BlockCache()
+
+
+_block_types = {
+    SdfBlockType.SDF_BLOCKTYPE_CONSTANT: BlockConstant,
+    SdfBlockType.SDF_BLOCKTYPE_PLAIN_VARIABLE: BlockPlainVariable,
+    SdfBlockType.SDF_BLOCKTYPE_POINT_VARIABLE: BlockPointVariable,
+    SdfBlockType.SDF_BLOCKTYPE_PLAIN_MESH: BlockPlainMesh,
+    SdfBlockType.SDF_BLOCKTYPE_POINT_MESH: BlockPointMesh,
+    SdfBlockType.SDF_BLOCKTYPE_NAMEVALUE: BlockNameValue,
+    SdfBlockType.SDF_BLOCKTYPE_ARRAY: BlockArray,
+}
+
+
+def _stride_key(key, stride):
+    """Combines a read index with a particle stride"""
+    if stride is None:
+        return key
+    if key is not Ellipsis:
+        raise ValueError("Only one of 'key' and 'stride' may be given")
+    return slice(None, None, stride)
+
+
+def iter_chunks(blocks, n):
+    """Iterates over point data in fixed-size chunks.
+
+    The data is read sequentially from the file, so memory use is bounded
+    by the chunk size however many particles the blocks contain.
+
+    Parameters
+    ----------
+    blocks : BlockPointVariable, BlockPointMesh or sequence of these
+        The blocks to read. All blocks must belong to the same species so
+        that the chunks stay aligned.
+    n : int
+        Number of particles in each chunk.
+
+    Yields
+    ------
+    tuple
+        The next ``n`` particles of each block. Point variables give an
+        array and point meshes a tuple of arrays, one for each component.
+    """
+    if isinstance(blocks, Block):
+        blocks = (blocks,)
+    npart = set(b.dims[0] for b in blocks)
+    if len(npart) > 1:
+        raise ValueError("Blocks have different numbers of particles")
+    yield from zip(*[b._chunks(n) for b in blocks])
 
 
 def get_run_info(block):
@@ -622,13 +1593,94 @@ def get_run_info(block):
     ri['io_data'] = datetime.utcfromtimestamp(r.io_date).strftime('%c')
     return ri
 
+def _get_header(h, filename):
+    c = h.contents
+    hdr = {}
+    hdr['filename'] = filename
+    hdr['file_version'] = c.file_version
+    hdr['file_revision'] = c.file_revision
+    hdr['code_name'] = c.code_name.decode() if c.code_name else ''
+    hdr['step'] = c.step
+    hdr['time'] = c.time
+    hdr['jobid1'] = c.jobid1
+    hdr['jobid2'] = c.jobid2
+    hdr['code_io_version'] = c.code_io_version
+    hdr['restart_flag'] = c.restart_flag
+    hdr['other_domains'] = c.other_domains
+    hdr['station_file'] = c.station_file
+    hdr['nblocks'] = c.nblocks
+    return hdr
+
 def get_member_name(name):
     sname = name.decode()
     return ''.join([i if ((i >= "a" and i <= "z") or (i >= "A" and i <= "Z") \
                     or (i >= "0" and i <= "9")) else "_" \
                     for i in sname])
 
-def read(filename, convert=False, derived=True):
+def _select_blocks(blocks, variables):
+    """Returns the blocks whose id, name or member name matches one of the
+    given names or glob patterns, together with the meshes they reference.
+    The run info block is always kept.
+    """
+    if isinstance(variables, str):
+        variables = [variables]
+    patterns = list(variables)
+
+    def matches(block):
+        keys = (block.id.decode(), block.name.decode(),
+                get_member_name(block.name))
+        return any(fnmatchcase(k, p) for p in patterns for k in keys)
+
+    var_types = (SdfBlockType.SDF_BLOCKTYPE_PLAIN_VARIABLE,
+                 SdfBlockType.SDF_BLOCKTYPE_POINT_VARIABLE)
+    mesh_types = (SdfBlockType.SDF_BLOCKTYPE_PLAIN_MESH,
+                  SdfBlockType.SDF_BLOCKTYPE_POINT_MESH)
+
+    selected = [matches(b) for b in blocks]
+    mesh_ids = set()
+    for block, sel in zip(blocks, selected):
+        if sel and block.blocktype in var_types and block.mesh_id:
+            mesh_ids.add(block.mesh_id.decode())
+
+    keep = []
+    for block, sel in zip(blocks, selected):
+        if sel or block.blocktype == SdfBlockType.SDF_BLOCKTYPE_RUN_INFO \
+                or (block.blocktype in mesh_types
+                    and block.id.decode() in mesh_ids):
+            keep.append(block)
+    return keep
+
+def header(filename):
+    """Reads only the header of an SDF file.
+
+    The block list is not read, so this is much faster than :func:`read`
+    when only the time, step or job id of a file is needed.
+
+    Parameters
+    ----------
+    filename : string
+        The name of the SDF file to open.
+
+    Returns
+    -------
+    dict
+        The file header, including ``time``, ``step``, ``jobid1``,
+        ``jobid2``, ``code_name`` and ``nblocks``.
+    """
+    clib = sdf_lib
+    clib.sdf_open.restype = ct.POINTER(SdfFile)
+    clib.sdf_open.argtypes = [ct.c_char_p, ct.c_int, ct.c_int, ct.c_int]
+    clib.sdf_close.argtypes = [ct.c_void_p]
+
+    h = clib.sdf_open(filename.encode("utf-8"), 0, SDF_READ, 0)
+    if h is None or not bool(h):
+        raise Exception(f"Failed to open file: '{filename}'")
+    try:
+        return _get_header(h, filename)
+    finally:
+        clib.sdf_close(h)
+
+def read(filename, convert=False, derived=True, variables=None, mmap=False):
     """Reads the SDF data and returns a dictionary of NumPy arrays.
 
     Parameters
@@ -639,6 +1691,169 @@ def read(filename, convert=False, derived=True):
         Convert double precision data to single when reading file.
     derived : bool, optional
         Include derived variables in the data structure.
+    variables : string or list of strings, optional
+        Only load the blocks whose id or name matches one of these names or
+        glob patterns, e.g. ``"ex"`` or ``"Electric Field/*"``. The meshes
+        referenced by the matching variables are always loaded.
+    mmap : bool, optional
+        Memory map the file. Native-endian data which needs no conversion
+        is then returned as read-only arrays backed directly by the mapped
+        file pages, which are shared between processes through the page
+        cache.
+    """
+
+    return BlockList(filename, convert, derived, variables, mmap)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def _get_executor():
+    """Returns the thread pool used for asynchronous reads"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(thread_name_prefix="sdfr")
+    return _executor
+
+async def aread(filename, *args, executor=None, **kwargs):
+    """Reads an SDF file without blocking the event loop.
+
+    Takes the same arguments as :func:`read`, which is run on an executor.
+    Block data can then be loaded with :meth:`Block.aload`.
+
+    Parameters
+    ----------
+    executor : concurrent.futures.Executor, optional
+        The executor to open the file in, which also limits the number of
+        concurrent reads. Defaults to a thread pool shared by all
+        asynchronous reads.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor or _get_executor(),
+                                      partial(read, filename, *args,
+                                              **kwargs))
+
+
+def _loadable(block):
+    """Whether a block has data which can be loaded. Some derived blocks,
+    such as the CPU split mesh, have no data type.
     """
+    return block.datatype != 0
 
-    return BlockList(filename, convert, derived)
+
+def _read_many_worker(filename, variables, func, kwargs):
+    """Reads a single file for read_many in a worker process"""
+    with BlockList(filename, variables=variables, **kwargs) as bl:
+        if func is not None:
+            return func(bl)
+        return {name: block.data for name, block in bl.items()
+                if _loadable(block)}
+
+
+def read_many(files, variables=None, func=None, workers=None, **kwargs):
+    """Reads many SDF files in parallel using a pool of processes.
+
+    Each file is opened in a worker process and only the result for that
+    file is sent back, so ``BlockList`` objects never need to be pickled.
+
+    Parameters
+    ----------
+    files : list of strings
+        The names of the SDF files to read.
+    variables : string or list of strings, optional
+        The blocks to load from each file, as for :func:`read`.
+    func : callable, optional
+        Function called in the worker with the ``BlockList`` of each file.
+        The function and its return value must both be picklable, so it
+        must be defined at module level rather than as a lambda or local
+        function. By default a dictionary mapping block names to their
+        data is returned, leaving out blocks which have no data.
+    workers : int, optional
+        Number of worker processes. Defaults to the number of CPUs.
+    **kwargs
+        Further arguments passed to :func:`read`.
+
+    Yields
+    ------
+    The result for each file, in the order of ``files``.
+    """
+    with ProcessPoolExecutor(workers) as pool:
+        yield from pool.map(_read_many_worker, files, repeat(variables),
+                            repeat(func), repeat(kwargs))
+
+
+def iter_files(files, variables=None, prefetch=2, **kwargs):
+    """Iterates over SDF files, reading ahead on a background thread.
+
+    While the caller processes one file, the following files are opened
+    and their blocks loaded in the background. At most ``prefetch`` files
+    are read ahead of the one the caller holds, counting any file still
+    being loaded, which bounds the memory used. Blocks without data, such
+    as the CPU split mesh, are not loaded.
+
+    Parameters
+    ----------
+    files : list of strings
+        The names of the SDF files to read.
+    variables : string or list of strings, optional
+        The blocks to load from each file, as for :func:`read`. All blocks
+        are loaded if not given.
+    prefetch : int, optional
+        Maximum number of files read ahead of the one being processed.
+    **kwargs
+        Further arguments passed to :func:`read`.
+
+    Yields
+    ------
+    BlockList
+        Each file in turn, with the data of its blocks already loaded.
+    """
+    ready = queue.Queue()
+    # A slot is reserved before a file is read, and freed once the file
+    # has been handed out
+    slots = threading.Semaphore(max(1, prefetch))
+    stop = threading.Event()
+
+    def reserve():
+        while not stop.is_set():
+            if slots.acquire(timeout=0.1):
+                return True
+        return False
+
+    def worker():
+        try:
+            for f in files:
+                if not reserve():
+                    return
+                bl = BlockList(f, variables=variables, **kwargs)
+                bl.load([name for name, block in bl.items()
+                         if _loadable(block)])
+                ready.put((bl, None))
+        except Exception as e:
+            ready.put((None, e))
+            return
+        ready.put((None, None))
+
+    thread = threading.Thread(target=worker, daemon=True)
+    thread.start()
+    try:
+        while True:
+            bl, error = ready.get()
+            if error is not None:
+                raise error
+            if bl is None:
+                return
+            slots.release()
+            yield bl
+    finally:
+        stop.set()
+        thread.join()
+        # Free the files read ahead which were never handed out
+        while True:
+            try:
+                bl, _ = ready.get_nowait()
+            except queue.Empty:
+                break
+            if bl is not None:
+                bl.close()
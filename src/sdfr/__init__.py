@@ -17,7 +17,12 @@
 
 _module_name = "sdfr"
 
-from .SDF import read
+from .SDF import read, aread, read_many, iter_files, header, iter_chunks
+from .SDF import BlockCache, SharedBlock, block_cache
+from .index import RunIndex
+from .particles import select, histogram
+from .series import Series, open_dask
+from .watch import watch
 from .sdf_helper import *
 from .loadlib import (
     __library_commit_date__,
@@ -0,0 +1,224 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright 2022 University of Warwick, University of York
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import os
+import sqlite3
+from .SDF import header, read
+from .watch import _is_complete
+
+INDEX_FILENAME = ".sdfr_index.sqlite"
+
+_schema = """
+CREATE TABLE IF NOT EXISTS files (
+    filename TEXT PRIMARY KEY,
+    size INTEGER,
+    mtime REAL,
+    jobid1 INTEGER,
+    jobid2 INTEGER,
+    time REAL,
+    step INTEGER,
+    code_name TEXT,
+    nblocks INTEGER,
+    blocks TEXT
+);
+CREATE INDEX IF NOT EXISTS files_time ON files (jobid1, time);
+CREATE INDEX IF NOT EXISTS files_step ON files (jobid1, step);
+CREATE INDEX IF NOT EXISTS files_mtime ON files (mtime);
+"""
+
+
+class RunIndex:
+    """Persistent index of the SDF files in a run directory.
+
+    The index records the size, modification time, job id, time, step and
+    block catalog of every SDF file in the directory. It is stored in a
+    sidecar SQLite database and only files which are new or have changed
+    since the last update are opened, so lookups by time or step are
+    index searches rather than a scan over every file.
+
+    Parameters
+    ----------
+    directory : string
+        The run directory.
+    filename : string, optional
+        Name of the index file within the directory. If it cannot be
+        written, an in-memory index is used instead.
+    update : bool, optional
+        Bring the index up to date on creation.
+    """
+    def __init__(self, directory, filename=INDEX_FILENAME, update=True):
+        self.directory = os.path.abspath(directory)
+        try:
+            self._db = sqlite3.connect(os.path.join(self.directory, filename))
+            self._db.executescript(_schema)
+        except sqlite3.Error:
+            self._db = sqlite3.connect(":memory:")
+            self._db.executescript(_schema)
+        if update:
+            self.update()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Closes the index database"""
+        self._db.close()
+
+    def update(self):
+        """Brings the index up to date with the files in the directory"""
+        db = self._db
+        known = {f: (size, mtime) for f, size, mtime
+                 in db.execute("SELECT filename, size, mtime FROM files")}
+        present = set()
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if not entry.name.endswith(".sdf") or not entry.is_file():
+                    continue
+                st = entry.stat()
+                present.add(entry.name)
+                if known.get(entry.name) == (st.st_size, st.st_mtime):
+                    continue
+                if not _is_complete(entry.path):
+                    # Still being written, so index it on a later update.
+                    # Reading the blocks of a partial file can crash.
+                    db.execute("DELETE FROM files WHERE filename = ?",
+                               (entry.name,))
+                    continue
+                try:
+                    hdr = header(entry.path)
+                    with read(entry.path, derived=False) as bl:
+                        blocks = {"ids": list(bl.by_id),
+                                  "names": list(bl.by_name)}
+                except Exception:
+                    # Unreadable
+                    continue
+                db.execute("INSERT OR REPLACE INTO files VALUES "
+                           "(?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                           (entry.name, st.st_size, st.st_mtime,
+                            hdr['jobid1'], hdr['jobid2'], hdr['time'],
+                            hdr['step'], hdr['code_name'], hdr['nblocks'],
+                            json.dumps(blocks)))
+        for f in set(known) - present:
+            db.execute("DELETE FROM files WHERE filename = ?", (f,))
+        db.commit()
+
+    def _path(self, filename):
+        return os.path.join(self.directory, filename)
+
+    def header(self, filename):
+        """Returns the indexed header fields of a file"""
+        row = self._db.execute(
+            "SELECT jobid1, jobid2, time, step, code_name, nblocks "
+            "FROM files WHERE filename = ?",
+            (os.path.basename(filename),)).fetchone()
+        if row is None:
+            raise KeyError(filename)
+        keys = ('jobid1', 'jobid2', 'time', 'step', 'code_name', 'nblocks')
+        hdr = dict(zip(keys, row))
+        hdr['filename'] = self._path(os.path.basename(filename))
+        return hdr
+
+    def job_id(self, filename=None):
+        """Returns the job ID of a file, or of the oldest file in the
+        directory if no indexed file is given
+        """
+        if filename is not None and os.path.isfile(filename):
+            try:
+                return self.header(filename)['jobid1']
+            except KeyError:
+                pass
+        row = self._db.execute("SELECT jobid1 FROM files WHERE nblocks > 0 "
+                               "ORDER BY mtime LIMIT 1").fetchone()
+        return None if row is None else row[0]
+
+    def files(self, job_id=None, varname=None):
+        """Returns the indexed files, oldest first.
+
+        Parameters
+        ----------
+        job_id : int, optional
+            Only return files with this job ID.
+        varname : str, optional
+            Only return files containing a block with this name or id.
+        """
+        query = "SELECT filename, blocks FROM files WHERE nblocks > 0"
+        args = ()
+        if job_id is not None:
+            query += " AND jobid1 = ?"
+            args = (job_id,)
+        file_list = []
+        for f, blocks in self._db.execute(query + " ORDER BY mtime", args):
+            if varname is not None:
+                blocks = json.loads(blocks)
+                if varname not in blocks["names"] \
+                        and varname not in blocks["ids"]:
+                    continue
+            file_list.append(self._path(f))
+        return file_list
+
+    def find(self, key, value=None, first=False, last=False, job_id=None):
+        """Returns the file closest to a given time or step.
+
+        Parameters
+        ----------
+        key : str
+            Either ``'time'`` or ``'step'``.
+        value : float or int, optional
+            The time or step to search for.
+        first : bool
+            Return the file with the earliest time or step.
+        last : bool
+            Return the file with the latest time or step. This is the
+            default if no value is given.
+        job_id : int, optional
+            Only consider files with this job ID.
+
+        Returns
+        -------
+        filename : str
+            The matching file, or None if the index is empty.
+        """
+        if key not in ('time', 'step'):
+            raise ValueError("key must be 'time' or 'step'")
+        where = "nblocks > 0"
+        args = ()
+        if job_id is not None:
+            where += " AND jobid1 = ?"
+            args = (job_id,)
+
+        def query(cond, order, extra=()):
+            return self._db.execute(
+                f"SELECT filename, {key} FROM files WHERE {where}{cond} "
+                f"ORDER BY {key} {order} LIMIT 1", args + extra).fetchone()
+
+        if value is None and not first:
+            last = True
+        if first or last:
+            row = query("", "ASC" if first else "DESC")
+            return None if row is None else self._path(row[0])
+
+        below = query(f" AND {key} <= ?", "DESC", (value,))
+        above = query(f" AND {key} >= ?", "ASC", (value,))
+        rows = [r for r in (below, above) if r is not None]
+        if not rows:
+            return None
+        row = min(rows, key=lambda r: abs(r[1] - value))
+        return self._path(row[0])
@@ -0,0 +1,350 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright 2022 University of Warwick, University of York
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import ast
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from .SDF import (BlockPointMesh, BlockPointVariable, SdfBlockType,
+                  get_member_name)
+
+# Default number of particles read at a time
+CHUNK_SIZE = 1 << 20
+
+_axes = {'x': 0, 'y': 1, 'z': 2}
+_point_types = (SdfBlockType.SDF_BLOCKTYPE_POINT_VARIABLE,
+                SdfBlockType.SDF_BLOCKTYPE_POINT_MESH)
+
+
+def _lookup(bl, key):
+    """Looks up a block by name, id or member name, or returns None"""
+    try:
+        return bl[key]
+    except KeyError:
+        return getattr(bl, key, None)
+
+
+def _column(bl, key, species=None):
+    """Resolves a particle column to a (block, component) pair.
+
+    A column is a point variable given by name, id or member name, or a
+    component of a point mesh given as ``<mesh>/<label>``, where the label
+    is an axis label or one of ``x``, ``y`` and ``z``. Columns can also be
+    given by the short names accepted by :func:`select`, either qualified
+    by species as ``Px_electron`` or ``Px/electron``, or unqualified, e.g.
+    ``Px``, for the given species or the only species with that column.
+    """
+    block = _lookup(bl, key)
+    if isinstance(block, BlockPointVariable):
+        return block, None
+    if '/' in key:
+        mesh_key, label = key.rsplit('/', 1)
+        mesh = _lookup(bl, mesh_key)
+        if isinstance(mesh, BlockPointMesh):
+            labels = [lab.lower() for lab in mesh.labels]
+            if label.lower() in labels:
+                return mesh, labels.index(label.lower())
+            if label.lower() in _axes \
+                    and _axes[label.lower()] < len(mesh.dims):
+                return mesh, _axes[label.lower()]
+    # Species names may themselves contain underscores
+    for i, sep in enumerate(key):
+        if sep in '/_':
+            column = _species_columns(bl, key[i+1:])[0].get(key[:i])
+            if column is not None:
+                return column
+    if species is None:
+        species = set(_species_ids(bl).values())
+    else:
+        species = [species]
+    matches = [column for column in
+               (_species_columns(bl, s)[0].get(key) for s in sorted(species))
+               if column is not None]
+    if len(matches) > 1:
+        raise KeyError(f"Particle column '{key}' is ambiguous, qualify it "
+                       f"with a species, e.g. '{key}_<species>'")
+    if matches:
+        return matches[0]
+    raise KeyError(f"No particle column '{key}'")
+
+
+def _species(block):
+    """Returns the species of a point block"""
+    try:
+        species = block.species_id
+    except AttributeError:
+        species = ''
+    if species:
+        return species
+    return block.name.rsplit('/', 1)[-1]
+
+
+def _species_ids(bl):
+    """Returns the species of each point block in a BlockList, keyed by
+    block name, without building the block wrappers
+    """
+    if bl.closed:
+        raise ValueError(f"I/O operation on closed SDF file "
+                         f"'{bl.Header['filename']}'")
+    species = {}
+    for name, blocktype, block in bl._table.values():
+        if blocktype in _point_types:
+            material = block.material_id
+            species[name] = material.decode() if material \
+                else name.rsplit('/', 1)[-1]
+    return species
+
+
+def _species_columns(bl, species):
+    """Returns the columns of a species keyed by their short names, e.g.
+    ``Px`` for ``Particles/Px/electron``, and by their full names, ids and
+    member names, along with the list of default output columns
+    """
+    columns = {}
+    default = []
+    for name, block_species in _species_ids(bl).items():
+        if block_species != species:
+            continue
+        block = bl[name]
+        if isinstance(block, BlockPointVariable):
+            short = block.name
+            if short.endswith('/' + species):
+                short = short[:-len(species) - 1]
+            short = short.rsplit('/', 1)[-1]
+            keys = (get_member_name(short.encode()), block.name, block.id,
+                    get_member_name(block.name.encode()))
+            default.append(keys[0])
+            for key in keys:
+                columns.setdefault(key, (block, None))
+        else:
+            for i, label in enumerate(block.labels):
+                keys = ('xyz'[i], label, label.lower()) if i < 3 \
+                    else (label, label.lower())
+                default.append(keys[0])
+                for key in keys:
+                    columns.setdefault(key, (block, i))
+    return columns, default
+
+
+def _npart(block):
+    return block.dims[0]
+
+
+def _read_range(block, component, start, stop):
+    """Reads particles ``start`` to ``stop`` of a column"""
+    if block._data is None and block._in_file():
+        itemsize = block._file_dtype().itemsize
+        offset = ((component or 0) * _npart(block) + start) * itemsize
+        return block._read_file((stop - start,), offset)
+    data = block.data if component is None else block.data[component]
+    return data[start:stop]
+
+
+def _read_rows(block, component, rows):
+    """Reads the given particles of a column"""
+    if block._data is None and block._in_file():
+        npart = _npart(block)
+        itemsize = block._file_dtype().itemsize
+        array = block._map_file((npart,), (component or 0) * npart * itemsize)
+        return np.array(array[rows], dtype=block.datatype)
+    data = block.data if component is None else block.data[component]
+    return data[rows]
+
+
+def select(bl, species, where=None, columns=None, chunk=CHUNK_SIZE):
+    """Selects the particles of a species matching a condition.
+
+    The condition is evaluated chunk by chunk, reading only the columns it
+    uses. Only the rows that pass are then read from the output columns,
+    so memory use is proportional to the size of the selection rather
+    than the number of particles in the species.
+
+    Parameters
+    ----------
+    bl : BlockList
+        The SDF data.
+    species : string
+        The species name, e.g. ``"electron"``.
+    where : string, optional
+        A NumPy expression in the species columns, e.g.
+        ``"(Px > 1e-21) & (x < 0)"``. Columns are referred to by their
+        short names, such as ``Px`` or ``Weight``, or by member name. Mesh
+        components are ``x``, ``y`` and ``z``. Combine conditions with
+        ``&``, ``|`` and ``~``. All particles are selected if not given.
+    columns : list of strings, optional
+        The columns to return, by short name or any name accepted by
+        ``where``, or as a block name, id or member name. Defaults to all
+        columns of the species, keyed by short name.
+    chunk : int, optional
+        Number of particles read at a time when evaluating the condition.
+
+    Returns
+    -------
+    dict
+        The selected values of each column, keyed by the given names,
+        along with ``"index"``, the positions of the selected particles.
+    """
+    species_cols, default = _species_columns(bl, species)
+    if not species_cols:
+        raise KeyError(f"No particle data for species '{species}'")
+
+    if columns is None:
+        columns = default
+    outputs = {}
+    for key in columns:
+        outputs[key] = species_cols.get(key) or _column(bl, key)
+
+    npart = _npart(next(iter(species_cols.values()))[0])
+
+    if where is None:
+        rows = np.arange(npart)
+    else:
+        expr = compile(where, '<where>', 'eval')
+        names = set(node.id for node in ast.walk(ast.parse(where,
+                                                           mode='eval'))
+                    if isinstance(node, ast.Name))
+        unknown = names - species_cols.keys() - {'np'}
+        if unknown:
+            raise KeyError(f"No particle column '{sorted(unknown)[0]}' for "
+                           f"species '{species}'")
+        filters = {k: species_cols[k] for k in names if k in species_cols}
+        rows = []
+        for start in range(0, npart, chunk):
+            stop = min(start + chunk, npart)
+            values = {k: _read_range(b, c, start, stop)
+                      for k, (b, c) in filters.items()}
+            mask = eval(expr, {'__builtins__': {}, 'np': np}, values)
+            rows.append(np.flatnonzero(mask) + start)
+        rows = np.concatenate(rows) if rows else np.empty(0, np.int64)
+
+    result = {k: _read_rows(b, c, rows) for k, (b, c) in outputs.items()}
+    result['index'] = rows
+    return result
+
+
+def _reduce(func, starts, workers, op=np.add):
+    """Applies func to each chunk and combines the results with op, using a
+    pool of threads if more than one worker is requested
+    """
+    def combine(results):
+        total = next(results)
+        for result in results:
+            total = op(total, result)
+        return total
+
+    if workers is None or workers <= 1:
+        return combine(map(func, starts))
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        return combine(ex.map(func, starts))
+
+
+def _bin_edges(bins, lo, hi):
+    if np.ndim(bins) > 0:
+        return np.asarray(bins, dtype=float)
+    if lo == hi:
+        lo, hi = lo - 0.5, hi + 0.5
+    return np.linspace(lo, hi, int(bins) + 1)
+
+
+def histogram(bl, x, y=None, bins=10, range=None, weights=None,
+              chunk=CHUNK_SIZE, workers=None):
+    """Computes a 1D histogram or 2D phase-space histogram of particle data.
+
+    The particle blocks are read in chunks, and the histogram of each chunk
+    is accumulated into the result, so the particle data is never held in
+    memory all at once. Chunks can be binned in parallel by a pool of
+    threads, and their partial histograms summed.
+
+    Parameters
+    ----------
+    bl : BlockList
+        The SDF data.
+    x : string
+        The column to bin along the first axis. This is a point variable
+        given by name, id or member name, or a component of a point mesh
+        such as ``"Grid_Particles_electron/x"``. Short names as used by
+        :func:`select` are accepted when qualified by species, e.g.
+        ``"Px_electron"``, or when only one species has the column.
+    y : string, optional
+        The column to bin along the second axis, giving a 2D histogram.
+        Short names, e.g. ``"Px"``, refer to the species of ``x``.
+    bins : int or sequence, optional
+        The number of bins or bin edges, as for ``numpy.histogram`` or
+        ``numpy.histogram2d``.
+    range : sequence, optional
+        The lower and upper range of the bins, as ``(min, max)`` or
+        ``((xmin, xmax), (ymin, ymax))``. If neither this nor the bin
+        edges are given, the range of the data is found with an extra
+        pass over the file.
+    weights : string, optional
+        A column giving the weight of each particle, e.g. ``"Weight"``,
+        resolved in the same way as ``y``.
+    chunk : int, optional
+        Number of particles read at a time.
+    workers : int, optional
+        Number of threads binning chunks in parallel.
+
+    Returns
+    -------
+    hist : ndarray
+        The histogram.
+    xedges : ndarray
+        The bin edges along the first axis.
+    yedges : ndarray
+        The bin edges along the second axis, for a 2D histogram only.
+    """
+    axes = [_column(bl, x)]
+    species = _species(axes[0][0])
+    if y is not None:
+        axes.append(_column(bl, y, species))
+    wcol = None if weights is None else _column(bl, weights, species)
+    npart = _npart(axes[0][0])
+    for block, comp in axes + ([wcol] if wcol else []):
+        if _npart(block) != npart:
+            raise ValueError("Particle columns have different lengths")
+    if npart == 0:
+        raise ValueError("No particles to bin")
+    starts = np.arange(0, npart, chunk)
+
+    def read(col, start):
+        return _read_range(col[0], col[1], start, min(start + chunk, npart))
+
+    if len(axes) == 1:
+        bins = [bins]
+        range = None if range is None else [range]
+    elif np.ndim(bins) == 0 or len(bins) != 2:
+        bins = [bins, bins]
+    if range is None and all(np.ndim(b) > 0 for b in bins):
+        range = [(None, None)] * len(bins)
+    elif range is None:
+        def limits(start):
+            values = [read(col, start) for col in axes]
+            return np.array([[-v.min(), v.max()] for v in values])
+        range = [(-lo, hi) for lo, hi
+                 in _reduce(limits, starts, workers, np.maximum)]
+    edges = [_bin_edges(b, lo, hi) for b, (lo, hi) in zip(bins, range)]
+
+    def partial(start):
+        values = [read(col, start) for col in axes]
+        w = None if wcol is None else read(wcol, start)
+        if len(values) == 1:
+            return np.histogram(values[0], edges[0], weights=w)[0]
+        return np.histogram2d(values[0], values[1], edges, weights=w)[0]
+
+    hist = _reduce(partial, starts, workers)
+    if len(axes) == 1:
+        return hist, edges[0]
+    return hist, edges[0], edges[1]
@@ -1,5 +1,6 @@
 import os
 import re
+from collections import OrderedDict
 try:
     import numpy as np
     import matplotlib.pyplot as plt
@@ -31,6 +32,10 @@ try:
 except ImportError:
     got_sdf = False
 
+from .SDF import BlockList, header, read as _read
+from .index import RunIndex
+from .watch import _is_complete
+
 try:
     from matplotlib.pyplot import *  # NOQA
     got_mpl = True
@@ -52,6 +57,10 @@ old_mtime = 0
 old_size = 0
 old_filename = ''
 cached = False
+# Maximum number of datasets and bytes of block data cached by getdata
+cache_entries = 4
+cache_bytes = None
+_data_cache = OrderedDict()
 fig = None
 im = None
 cbar = None
@@ -319,9 +328,9 @@ def get_job_id(file_list=None, base=None, block=None):
 
     if base is not None:
         try:
-            data = sdf.read(base, mmap=0)
-            if len(data.__dict__) > 1:
-                return data.Header['jobid1']
+            hdr = header(base)
+            if hdr['nblocks'] > 0:
+                return hdr['jobid1']
         except:
             pass
 
@@ -329,17 +338,18 @@ def get_job_id(file_list=None, base=None, block=None):
     if file_list is not None:
         for f in file_list:
             try:
-                data = sdf.read(f, mmap=0)
-                if len(data.__dict__) < 2:
+                hdr = header(f)
+                if hdr['nblocks'] < 1:
                     continue
-                return data.Header['jobid1']
+                return hdr['jobid1']
             except:
                 pass
 
     return None
 
 
-def get_files(wkd=None, base=None, block=None, varname=None, fast=True):
+def get_files(wkd=None, base=None, block=None, varname=None, fast=True,
+              index=False):
     """Get a list of SDF filenames belonging to the same run
 
        Parameters
@@ -357,6 +367,9 @@ def get_files(wkd=None, base=None, block=None, varname=None, fast=True):
        fast : bool
            Assume that files follow strict datestamp ordering and exit once
            the first file that doesn't match the job ID
+       index : bool
+           Use the persistent run index in the directory, creating or
+           updating it as required
 
        Returns
        -------
@@ -382,6 +395,11 @@ def get_files(wkd=None, base=None, block=None, varname=None, fast=True):
             base = block.Header['filename']
 
     flist = get_file_list(wkd=wkd, base=base)
+
+    if index and len(flist) > 0:
+        with _run_index(flist) as idx:
+            return idx.files(job_id=idx.job_id(base), varname=varname)
+
     flist.sort(key=lambda x: os.path.getmtime(x))
 
     job_id = get_job_id(flist, base=base, block=block)
@@ -390,15 +408,18 @@ def get_files(wkd=None, base=None, block=None, varname=None, fast=True):
     file_list = []
     for f in reversed(flist):
         try:
-            data = sdf.read(f, mmap=0, dict=True)
-            if len(data) < 2:
+            hdr = header(f)
+            if hdr['nblocks'] < 1:
                 continue
-            file_job_id = data['Header']['jobid1']
+            file_job_id = hdr['jobid1']
             if file_job_id == job_id:
                 if varname is None:
                     file_list.append(f)
-                elif varname in data:
-                    file_list.append(f)
+                elif _is_complete(f):
+                    # Reading the blocks of a partial file can crash
+                    with _read(f) as data:
+                        if varname in data:
+                            file_list.append(f)
             elif len(file_list) > 0:
                 break
         except:
@@ -408,7 +429,7 @@ def get_files(wkd=None, base=None, block=None, varname=None, fast=True):
 
 
 def get_time(time=0, first=False, last=False, wkd=None, base=None, block=None,
-             fast=True):
+             fast=True, index=False):
     """Get an SDF dataset that matches a given time
 
        Parameters
@@ -430,6 +451,9 @@ def get_time(time=0, first=False, last=False, wkd=None, base=None, block=None,
            A representative sdf dataset or block
        fast : bool
            Use a faster but less thorough method for returning first/last
+       index : bool
+           Use the persistent run index in the directory, creating or
+           updating it as required
 
        Returns
        -------
@@ -444,6 +468,15 @@ def get_time(time=0, first=False, last=False, wkd=None, base=None, block=None,
         print("No SDF files found")
         return
 
+    if index:
+        with _run_index(flist) as idx:
+            fname = idx.find('time', time, first=first, last=last,
+                             job_id=idx.job_id(base))
+        if fname is None:
+            raise Exception("No valid file found in directory: " + wkdir)
+        data = getdata(fname, verbose=False)
+        return data
+
     flist.sort(key=lambda x: os.path.getmtime(x))
     job_id = get_job_id(flist, base=base, block=block)
 
@@ -459,13 +492,16 @@ def get_time(time=0, first=False, last=False, wkd=None, base=None, block=None,
         t_old = 1e90
 
     for f in flist:
-        dat_tmp = sdf.read(f)
-        if len(dat_tmp.__dict__) < 2:
+        try:
+            hdr = header(f)
+        except Exception:
+            continue
+        if hdr['nblocks'] < 1:
             continue
-        if job_id != dat_tmp.Header['jobid1']:
+        if job_id != hdr['jobid1']:
             continue
 
-        t = dat_tmp.Header['time']
+        t = hdr['time']
         if last:
             if fast:
                 fname = f
@@ -497,7 +533,7 @@ def get_time(time=0, first=False, last=False, wkd=None, base=None, block=None,
 
 
 def get_step(step=0, first=False, last=False, wkd=None, base=None, block=None,
-             fast=True):
+             fast=True, index=False):
     """Get an SDF dataset that matches a given step
 
        Parameters
@@ -519,6 +555,9 @@ def get_step(step=0, first=False, last=False, wkd=None, base=None, block=None,
            A representative sdf dataset or block
        fast : bool
            Use a faster but less thorough method for returning first/last
+       index : bool
+           Use the persistent run index in the directory, creating or
+           updating it as required
 
        Returns
        -------
@@ -533,6 +572,15 @@ def get_step(step=0, first=False, last=False, wkd=None, base=None, block=None,
         print("No SDF files found")
         return
 
+    if index:
+        with _run_index(flist) as idx:
+            fname = idx.find('step', step, first=first, last=last,
+                             job_id=idx.job_id(base))
+        if fname is None:
+            raise Exception("No valid file found in directory: " + wkdir)
+        data = getdata(fname, verbose=False)
+        return data
+
     flist.sort(key=lambda x: os.path.getmtime(x))
     job_id = get_job_id(flist, base=base, block=block)
 
@@ -548,13 +596,16 @@ def get_step(step=0, first=False, last=False, wkd=None, base=None, block=None,
         t_old = 1e90
 
     for f in flist:
-        dat_tmp = sdf.read(f)
-        if len(dat_tmp.__dict__) < 2:
+        try:
+            hdr = header(f)
+        except Exception:
+            continue
+        if hdr['nblocks'] < 1:
             continue
-        if job_id != dat_tmp.Header['jobid1']:
+        if job_id != hdr['jobid1']:
             continue
 
-        t = dat_tmp.Header['step']
+        t = hdr['step']
         if last:
             if fast:
                 fname = f
@@ -585,7 +636,12 @@ def get_step(step=0, first=False, last=False, wkd=None, base=None, block=None,
     return data
 
 
-def get_latest(wkd=None, base=None, block=None):
+def _run_index(flist):
+    """Opens the run index for the directory containing a list of files"""
+    return RunIndex(os.path.dirname(os.path.abspath(flist[0])))
+
+
+def get_latest(wkd=None, base=None, block=None, index=False):
     """Get the latest SDF dataset in a directory
 
        Parameters
@@ -598,13 +654,15 @@ def get_latest(wkd=None, base=None, block=None):
            A representative filename or directory
        block : sdf.Block or sdf.BlockList
            A representative sdf dataset or block
+       index : bool
+           Use the persistent run index in the directory
 
        Returns
        -------
        data : sdf.BlockList
            An SDF dataset
     """
-    return get_step(last=True, wkd=wkd, base=base, block=base)
+    return get_step(last=True, wkd=wkd, base=base, block=base, index=index)
 
 
 def get_first(every=False, wkd=None, base=None, block=None):
@@ -626,8 +684,7 @@ def get_oldest_file(wkd=None, base=None, block=None):
     flist.sort(key=lambda x: os.path.getmtime(x))
     for n in range(len(flist)):
         f = flist[n]
-        data = sdf.read(f, mmap=0, dict=True)
-        if len(data) > 1:
+        if header(f)['nblocks'] > 0:
             return f
 
     return None
@@ -640,8 +697,7 @@ def get_newest_file(wkd=None, base=None, block=None):
     flist.sort(key=lambda x: os.path.getmtime(x))
     for n in range(len(flist)):
         f = flist[-n-1]
-        data = sdf.read(f, mmap=0, dict=True)
-        if len(data) > 1:
+        if header(f)['nblocks'] > 0:
             return f
 
     return None
@@ -1772,22 +1828,28 @@ def getdata(fname, wkd=None, verbose=True, squeeze=False):
             print("ERROR opening file {0}: {1}".format(filename, e.strerror))
             raise
 
-    if st.st_mtime != old_mtime or st.st_size != old_size \
-            or filename != old_filename:
-        if verbose:
-            print("Reading file " + filename)
-        data = sdf.read(filename)
-        old_mtime = st.st_mtime
-        old_size = st.st_size
-        old_filename = filename
-    else:
+    if st.st_mtime == old_mtime and st.st_size == old_size \
+            and filename == old_filename:
         cached = True
         return data
 
-    cached = False
-
-    if squeeze:
-        for key, value in data.__dict__.items():
+    key = (os.path.abspath(filename), st.st_mtime, st.st_size)
+    if key in _data_cache:
+        _data_cache.move_to_end(key)
+        data = _data_cache[key]
+        cached = True
+    else:
+        if verbose:
+            print("Reading file " + filename)
+        data = sdf.read(filename)
+        _data_cache[key] = data
+        cached = False
+    old_mtime = st.st_mtime
+    old_size = st.st_size
+    old_filename = filename
+
+    if squeeze and not cached:
+        for key, value in _members(data).items():
             # Remove single element dimensions
             try:
                 dims = []
@@ -1798,7 +1860,7 @@ def getdata(fname, wkd=None, verbose=True, squeeze=False):
                 pass
 
     sdfdict = {}
-    for key, value in data.__dict__.items():
+    for key, value in _members(data).items():
         if hasattr(value, "id"):
             sdfdict[value.id] = value
         else:
@@ -1903,7 +1965,7 @@ def getdata(fname, wkd=None, verbose=True, squeeze=False):
             builtins.__dict__[key] = var
 
     # Export particle arrays
-    for k, value in data.__dict__.items():
+    for k, value in _members(data).items():
         if type(value) != sdf.BlockPointVariable \
                 and type(value) != sdf.BlockPointMesh:
             continue
@@ -1933,10 +1995,64 @@ def getdata(fname, wkd=None, verbose=True, squeeze=False):
                 globals()[gkey] = var
                 builtins.__dict__[gkey] = var
 
+    _evict_data_cache()
+
     # X, Y = np.meshgrid(x, y)
     return data
 
 
+def _members(data):
+    """Attributes of a dataset, including BlockList blocks which have not
+    been accessed yet
+    """
+    if isinstance(data, BlockList):
+        # Block attributes are only created when a block is first accessed
+        for _ in data.values():
+            pass
+    return data.__dict__
+
+
+def _cache_nbytes(dataset):
+    """Size of the block data held by a cached dataset"""
+    nbytes = 0
+    for value in dataset.__dict__.values():
+        if hasattr(value, '_data'):
+            # Do not trigger loading of lazy blocks
+            value = value._data
+        else:
+            value = getattr(value, 'data', None)
+        arrays = value if isinstance(value, tuple) else (value,)
+        for array in arrays:
+            nbytes += getattr(array, 'nbytes', 0)
+    return nbytes
+
+
+def _evict_data_cache():
+    """Evicts the least recently used datasets from the getdata cache,
+    always keeping the most recent one
+    """
+    while len(_data_cache) > 1:
+        if len(_data_cache) <= max(cache_entries, 1):
+            if cache_bytes is None:
+                break
+            total = sum(_cache_nbytes(d) for d in _data_cache.values())
+            if total <= cache_bytes:
+                break
+        _, dataset = _data_cache.popitem(last=False)
+        if hasattr(dataset, 'close'):
+            dataset.close()
+
+
+def clear_data_cache():
+    """Empties the getdata cache, freeing the cached datasets"""
+    global old_filename
+    while _data_cache:
+        _, dataset = _data_cache.popitem(last=False)
+        if hasattr(dataset, 'close') and dataset is not data:
+            dataset.close()
+    old_filename = ''
+
+
 def ogrid(skip=None, **kwargs):
     global x, y, mult_x, mult_y
     if np.ndim(x) == 1:
@@ -2059,7 +2175,7 @@ def subarray(base, slices):
 
 
 def list_variables(data):
-    dct = data.__dict__
+    dct = _members(data)
     for key in sorted(dct):
         try:
             val = dct[key]
@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright 2022 University of Warwick, University of York
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import glob
+import os
+import numpy as np
+from .SDF import _dask_array, header, read
+
+
+def _get_block(bl, name):
+    """Looks up a block by name, id or member name"""
+    try:
+        return bl[name]
+    except KeyError:
+        return getattr(bl, name)
+
+
+class Series:
+    """A time series of SDF dumps.
+
+    Indexing the series by a block name, id or member name returns a
+    :class:`SeriesArray` which is only read from disk when it is sliced.
+    Only the headers of the dumps are read when the series is created.
+
+    Parameters
+    ----------
+    files : string or list of strings
+        A directory containing SDF files, or a list of file names.
+    convert : bool, optional
+        Convert double precision data to single when reading files.
+    """
+    def __init__(self, files, convert=False):
+        if isinstance(files, str):
+            files = sorted(glob.glob(os.path.join(files, "*.sdf")))
+        headers = []
+        for f in files:
+            try:
+                hdr = header(f)
+            except Exception:
+                continue
+            if hdr['nblocks'] > 0:
+                headers.append(hdr)
+        # Dumps with the same time and step, such as restart dumps, are
+        # ordered by file name
+        headers.sort(key=lambda hdr: (hdr['time'], hdr['step'],
+                                      hdr['filename']))
+        self._headers = headers
+        self._convert = convert
+
+    def __len__(self):
+        return len(self._headers)
+
+    def __getitem__(self, name):
+        return SeriesArray(self, name)
+
+    @property
+    def files(self):
+        """File names of the dumps, in time order"""
+        return [hdr['filename'] for hdr in self._headers]
+
+    @property
+    def headers(self):
+        """Headers of the dumps"""
+        return list(self._headers)
+
+    @property
+    def time(self):
+        """Simulation time of each dump"""
+        return np.array([hdr['time'] for hdr in self._headers])
+
+    @property
+    def step(self):
+        """Simulation step of each dump"""
+        return np.array([hdr['step'] for hdr in self._headers])
+
+    def _read(self, index, name, key):
+        with read(self.files[index], convert=self._convert,
+                  variables=name) as bl:
+            block = _get_block(bl, name)
+            if hasattr(block, 'read'):
+                return np.asarray(block.read(key))
+            return np.asarray(block.data)[key]
+
+
+class SeriesArray:
+    """A block stacked over the dumps of a :class:`Series`.
+
+    The first axis indexes the dump and the remaining axes the block data.
+    Slicing reads only the dumps that the slice selects, and only the
+    selected region of each of them. The block must have the same
+    dimensions in every dump.
+    """
+    def __init__(self, series, name):
+        if len(series) == 0:
+            raise ValueError(f"Cannot read '{name}' from a series with no "
+                             f"dumps")
+        self._series = series
+        self._name = name
+        with read(series.files[0], convert=series._convert,
+                  variables=name) as bl:
+            block = _get_block(bl, name)
+            self._dims = tuple(block.dims)
+            self._dtype = np.dtype(block.datatype)
+            self._units = getattr(block, 'units', None)
+
+    def __len__(self):
+        return len(self._series)
+
+    def __getitem__(self, key):
+        key = self._expand_key(key)
+        index = np.arange(len(self._series))[key[0]]
+        rest = key[1:]
+        if np.ndim(index) == 0:
+            return self._series._read(index, self._name, rest)
+        return np.stack([self._series._read(i, self._name, rest)
+                         for i in index])
+
+    def _expand_key(self, key):
+        """Returns the key with an ``Ellipsis`` replaced by full slices, so
+        that its first element always indexes the dump
+        """
+        if not isinstance(key, tuple):
+            key = (key,)
+        if any(k is None for k in key):
+            raise IndexError("SeriesArray does not support np.newaxis")
+        nellipsis = sum(k is Ellipsis for k in key)
+        if nellipsis > 1:
+            raise IndexError("an index can only have a single ellipsis "
+                             "('...')")
+        if nellipsis:
+            i = next(i for i, k in enumerate(key) if k is Ellipsis)
+            fill = (slice(None),) * (self.ndim - len(key) + 1)
+            key = key[:i] + fill + key[i+1:]
+        if len(key) > self.ndim:
+            raise IndexError(f"too many indices for array: array is "
+                             f"{self.ndim}-dimensional, but {len(key)} "
+                             f"were indexed")
+        return key or (slice(None),)
+
+    def __array__(self, dtype=None):
+        array = self[:]
+        return array if dtype is None else array.astype(dtype)
+
+    @property
+    def dtype(self):
+        """Data type"""
+        return self._dtype
+
+    @property
+    def name(self):
+        """Block name"""
+        return self._name
+
+    @property
+    def ndim(self):
+        """Number of dimensions"""
+        return len(self.shape)
+
+    @property
+    def shape(self):
+        """Shape of the stacked array"""
+        return (len(self._series),) + self._dims
+
+    @property
+    def time(self):
+        """Simulation time of each dump"""
+        return self._series.time
+
+    @property
+    def units(self):
+        """Units of variable"""
+        return self._units
+
+
+def open_dask(files, variable, chunks='auto', convert=False):
+    """Stacks a block from many SDF files into a lazy dask array.
+
+    The first axis indexes the file. Every chunk is read by a task which
+    reopens its file, so no ctypes handles need to be pickled and the
+    graph can run on a distributed cluster. The block must have the same
+    dimensions in every file.
+
+    Parameters
+    ----------
+    files : string or list of strings
+        A directory containing SDF files, or a list of file names. Files
+        in a directory are ordered by time.
+    variable : string
+        Name, id or member name of the block.
+    chunks : int, tuple or str, optional
+        Chunk shape within each file, in any form accepted by
+        ``dask.array``.
+    convert : bool, optional
+        Convert double precision data to single when reading files.
+    """
+    import dask.array as da
+
+    if isinstance(files, str):
+        files = Series(files).files
+    files = list(files)
+    with read(files[0], convert=convert, variables=variable) as bl:
+        block = _get_block(bl, variable)
+        block_id = block.id
+        dims = tuple(block.dims)
+        dtype = block.datatype
+    return da.stack([_dask_array(f, block_id, dims, dtype, chunks, convert,
+                                 True) for f in files])
@@ -0,0 +1,222 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright 2022 University of Warwick, University of York
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import ctypes as ct
+import os
+import select
+import struct
+import sys
+import time
+from fnmatch import fnmatchcase
+from .SDF import SDF_READ, SdfFile, _close_handle, sdf_lib
+
+# inotify event masks, from <sys/inotify.h>
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_NONBLOCK = os.O_NONBLOCK
+_event_header = struct.Struct("iIII")
+
+
+def _inotify_open(directory):
+    """Returns an inotify descriptor watching a directory, or None if
+    inotify is not available
+    """
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ct.CDLL(None, use_errno=True)
+        fd = libc.inotify_init1(_IN_NONBLOCK)
+        if fd < 0:
+            return None
+        mask = _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE
+        if libc.inotify_add_watch(fd, os.fsencode(directory), mask) < 0:
+            os.close(fd)
+            return None
+    except (OSError, AttributeError):
+        return None
+    return fd
+
+
+def _inotify_events(fd):
+    """Reads the pending inotify events, yielding (name, mask) pairs"""
+    try:
+        buf = os.read(fd, 65536)
+    except BlockingIOError:
+        return
+    pos = 0
+    while pos + _event_header.size <= len(buf):
+        wd, mask, cookie, length = _event_header.unpack_from(buf, pos)
+        pos += _event_header.size
+        name = buf[pos:pos + length].rstrip(b"\0")
+        pos += length
+        yield os.fsdecode(name), mask
+
+
+def _stat(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+def _is_complete(filename):
+    """Whether an SDF file has been completely written.
+
+    The file must be large enough to hold its summary and the data of
+    every block listed in it. The summary is only read once the file is
+    long enough to contain it.
+    """
+    clib = sdf_lib
+    clib.sdf_open.restype = ct.POINTER(SdfFile)
+    clib.sdf_open.argtypes = [ct.c_char_p, ct.c_int, ct.c_int, ct.c_int]
+    clib.sdf_stack_init.argtypes = [ct.c_void_p]
+    clib.sdf_read_blocklist.argtypes = [ct.c_void_p]
+    clib.sdf_close.argtypes = [ct.c_void_p]
+
+    h = clib.sdf_open(filename.encode("utf-8"), 0, SDF_READ, 0)
+    if h is None or not bool(h):
+        return False
+    c = h.contents
+    size = os.path.getsize(filename)
+    if c.nblocks <= 0 or c.summary_location <= 0 \
+            or size < c.summary_location + c.summary_size:
+        clib.sdf_close(h)
+        return False
+    h._clib = clib
+    clib.sdf_stack_init(h)
+    try:
+        if clib.sdf_read_blocklist(h) != 0:
+            return False
+        block = c.blocklist
+        for n in range(c.nblocks):
+            if not block:
+                return False
+            block = block.contents
+            if block.data_location + block.data_length > size:
+                return False
+            block = block.next
+        return True
+    finally:
+        _close_handle(h)
+
+
+def _complete(path):
+    """Whether a file is a complete, readable SDF file"""
+    try:
+        return _is_complete(path)
+    except Exception:
+        return False
+
+
+def watch(directory, pattern="*.sdf", interval=1.0, timeout=None,
+          existing=False):
+    """Follows the dumps written by a running simulation.
+
+    Each new file is yielded once it has been completely written. On Linux
+    new files are detected with inotify; elsewhere the directory is
+    polled, and only rescanned when its modification time changes. With
+    inotify a new file is complete once the writer has closed it; when
+    polling, once its size and modification time are unchanged over one
+    polling interval. In both cases the file must also be long enough to
+    hold its summary and all of its block data.
+
+    Parameters
+    ----------
+    directory : string
+        The directory to watch.
+    pattern : string, optional
+        Glob pattern matched against the names of new files.
+    interval : float, optional
+        Polling interval in seconds.
+    timeout : float, optional
+        Stop once no new dump has appeared for this many seconds. By
+        default the directory is watched forever.
+    existing : bool, optional
+        Also yield the files already present in the directory.
+
+    Yields
+    ------
+    string
+        The path of each completed dump.
+    """
+    directory = os.path.abspath(directory)
+
+    def scan():
+        with os.scandir(directory) as it:
+            return set(e.name for e in it if fnmatchcase(e.name, pattern))
+
+    seen = set()
+    pending = {}
+    # Files closed by the writer, or present before the watch started
+    closed = set()
+    for name in sorted(scan()):
+        if existing:
+            pending[name] = None
+            closed.add(name)
+        else:
+            seen.add(name)
+
+    fd = _inotify_open(directory)
+    dir_mtime = _stat(directory)
+    last_found = time.monotonic()
+    try:
+        while True:
+            if fd is not None:
+                ready, _, _ = select.select([fd], [], [], interval)
+                for name, mask in (_inotify_events(fd) if ready else []):
+                    if name in seen or not fnmatchcase(name, pattern):
+                        continue
+                    if mask & (_IN_CLOSE_WRITE | _IN_MOVED_TO):
+                        # Closed by the writer, so no need to wait
+                        pending[name] = _stat(os.path.join(directory, name))
+                        closed.add(name)
+                    else:
+                        pending.setdefault(name, None)
+            else:
+                time.sleep(interval)
+                mtime = _stat(directory)
+                if mtime != dir_mtime:
+                    dir_mtime = mtime
+                    for name in scan() - seen:
+                        pending.setdefault(name, None)
+
+            for name in sorted(pending):
+                path = os.path.join(directory, name)
+                st = _stat(path)
+                if st is None:
+                    del pending[name]
+                    closed.discard(name)
+                elif st != pending[name]:
+                    pending[name] = st
+                elif fd is not None and name not in closed:
+                    # Still open for writing
+                    continue
+                elif _complete(path):
+                    del pending[name]
+                    closed.discard(name)
+                    seen.add(name)
+                    last_found = time.monotonic()
+                    yield path
+
+            if timeout is not None \
+                    and time.monotonic() - last_found > timeout:
+                return
+    finally:
+        if fd is not None:
+            os.close(fd)
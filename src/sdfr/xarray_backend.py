@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+# Copyright 2022 University of Warwick, University of York
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""xarray backend for SDF files.
+
+Registered as the ``sdfr`` engine, so that files can be opened with
+``xr.open_dataset(filename, engine="sdfr")``.
+"""
+
+import os
+import numpy as np
+import xarray as xr
+from xarray.backends import (BackendArray, BackendEntrypoint,
+                              CachingFileManager)
+from xarray.core import indexing
+from .SDF import (BlockPlainVariable, BlockPointVariable, get_member_name,
+                  read)
+
+
+def _open(filename, mode, convert, derived):
+    """Opens an SDF file for a ``CachingFileManager``, which always passes
+    the file mode once it has been pickled
+    """
+    return read(filename, convert, derived)
+
+
+class SdfBackendArray(BackendArray):
+    """Lazy array over an SDF variable block.
+
+    Indexing reads only the selected region of the block from the file.
+    The file is held by a ``CachingFileManager``, which keeps it open while
+    the array is in use and reopens it after the array has been pickled.
+    """
+    def __init__(self, manager, block):
+        self._manager = manager
+        self._id = block.id
+        self.shape = tuple(block.dims)
+        self.dtype = np.dtype(block.datatype)
+
+    def _get_block(self):
+        return self._manager.acquire().by_id[self._id]
+
+    def __getitem__(self, key):
+        return indexing.explicit_indexing_adapter(
+            key, self.shape, indexing.IndexingSupport.BASIC,
+            self._raw_indexing_method)
+
+    def _raw_indexing_method(self, key):
+        return np.asarray(self._get_block().read(key))
+
+
+def _grid_coords(var, coords):
+    """Returns the dimension names of a plain variable, adding coordinates
+    taken from its mesh
+    """
+    grid = var.grid
+    if grid is None:
+        return tuple(f"{get_member_name(var.id.encode())}_{i}"
+                     for i in range(len(var.dims)))
+    gname = get_member_name(grid.id.encode())
+    dims = []
+    for i, n in enumerate(var.dims):
+        label = get_member_name(grid.labels[i].encode()) \
+            if i < len(grid.labels) else str(i)
+        nodes = grid.data[i] if i < len(grid.data) else None
+        if nodes is not None and np.ndim(nodes) != 1:
+            nodes = None
+        if nodes is not None and len(nodes) == n + 1:
+            # Cell-centred variable on a node-centred grid
+            dim = f"{gname}_{label}_mid"
+            values = 0.5 * (nodes[1:] + nodes[:-1])
+        else:
+            dim = f"{gname}_{label}"
+            values = nodes if nodes is not None and len(nodes) == n \
+                else None
+        if values is not None and dim not in coords:
+            attrs = {'units': grid.units[i] if i < len(grid.units) else '',
+                     'long_name': grid.labels[i]
+                     if i < len(grid.labels) else ''}
+            coords[dim] = xr.Variable((dim,), values, attrs)
+        dims.append(dim)
+    return tuple(dims)
+
+
+def open_sdf_dataset(filename, drop_variables=None, convert=False,
+                     derived=True):
+    """Opens an SDF file as an xarray Dataset with lazily loaded variables.
+
+    Parameters
+    ----------
+    filename : string
+        The name of the SDF file to open.
+    drop_variables : string or list of strings, optional
+        Variables to leave out, by member name, block name or id.
+    convert : bool, optional
+        Convert double precision data to single when reading file.
+    derived : bool, optional
+        Include derived variables in the data structure.
+    """
+    if isinstance(drop_variables, str):
+        drop_variables = [drop_variables]
+    drop = set(drop_variables or [])
+
+    manager = CachingFileManager(_open, filename, mode='r',
+                                 kwargs={'convert': convert,
+                                         'derived': derived})
+    bl = manager.acquire()
+    coords = {}
+    data_vars = {}
+    for name in bl:
+        block = bl[name]
+        if not isinstance(block, BlockPlainVariable):
+            continue
+        member = get_member_name(block.name.encode())
+        if drop.intersection((member, block.name, block.id)):
+            continue
+        if isinstance(block, BlockPointVariable):
+            mesh = get_member_name(block.grid_id.encode())
+            dims = (f"{mesh}_index",)
+        else:
+            dims = _grid_coords(block, coords)
+        attrs = {'units': block.units,
+                 'full_name': block.name,
+                 'id': block.id,
+                 'mult': block.mult,
+                 'stagger': block.stagger.name}
+        array = indexing.LazilyIndexedArray(
+            SdfBackendArray(manager, block))
+        data_vars[member] = xr.Variable(dims, array, attrs)
+
+    ds = xr.Dataset(data_vars, coords=coords, attrs=dict(bl.Header))
+    ds.set_close(manager.close)
+    return ds
+
+
+class SdfBackendEntrypoint(BackendEntrypoint):
+    """xarray backend entry point for SDF files"""
+    description = "Open SDF files with sdfr"
+    open_dataset_parameters = ["filename_or_obj", "drop_variables",
+                               "convert", "derived"]
+
+    def open_dataset(self, filename_or_obj, *, drop_variables=None,
+                     convert=False, derived=True):
+        return open_sdf_dataset(os.fspath(filename_or_obj),
+                                drop_variables=drop_variables,
+                                convert=convert, derived=derived)
+
+    def guess_can_open(self, filename_or_obj):
+        try:
+            ext = os.path.splitext(os.fspath(filename_or_obj))[1]
+        except TypeError:
+            return False
+        return ext == ".sdf"
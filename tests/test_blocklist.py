@@ -0,0 +1,123 @@
+import gc
+import os
+
+import numpy as np
+import pytest
+
+import sdfr
+
+DATA = os.path.join(os.path.dirname(__file__), "data", "0000.sdf")
+EX = np.arange(12.).reshape(4, 3, order='F')
+PX = np.linspace(-1, 1, 20)
+
+
+@pytest.fixture
+def closes(monkeypatch):
+    """Records the C file handles freed"""
+    closed = []
+    close_handle = sdfr.SDF._close_handle
+
+    def record(h):
+        closed.append(h)
+        close_handle(h)
+
+    monkeypatch.setattr(sdfr.SDF, "_close_handle", record)
+    return closed
+
+
+@pytest.mark.parametrize("convert, dtype", [(False, np.float64),
+                                            (True, np.float32)])
+def test_data_and_load(convert, dtype):
+    with sdfr.read(DATA, convert=convert) as bl:
+        ex = bl["ex"]
+        assert ex.datatype == dtype
+        data = ex.data
+        assert data.dtype == dtype
+        assert np.array_equal(data, EX)
+    with sdfr.read(DATA, convert=convert) as bl:
+        # Read directly from the file, without the C library
+        loaded = bl["ex"].load()
+        assert loaded.dtype == dtype
+        assert np.array_equal(loaded, EX)
+        assert bl["ex"].data is loaded
+        assert bl._handle._nbuffers == 0
+        px = bl.load(["px/electron", "Grid/Particles/electron"])
+        assert np.allclose(px["px/electron"], PX)
+        assert len(px["Grid/Particles/electron"]) == 2
+
+
+def test_load_dtype_leaves_data():
+    with sdfr.read(DATA) as bl:
+        ex = bl["ex"]
+        loaded = ex.load(np.float32)
+        assert loaded.dtype == np.float32
+        assert np.array_equal(loaded, EX)
+        assert ex.datatype == np.float64
+        assert ex.data.dtype == np.float64
+
+
+def test_arrays_valid_after_close(closes):
+    bl = sdfr.read(DATA)
+    ex = bl["ex"]
+    data = ex.data
+    bl.close()
+    assert bl.closed
+    assert np.array_equal(data, EX)
+    # The C buffer keeps the handle alive
+    assert closes == []
+    del data
+    gc.collect()
+    assert len(closes) == 1
+
+
+def test_close_without_buffers(closes):
+    bl = sdfr.read(DATA)
+    bl["ex"].load()
+    bl.close()
+    assert len(closes) == 1
+    bl.close()
+    assert len(closes) == 1
+
+
+def test_load_after_close():
+    bl = sdfr.read(DATA)
+    ex = bl["ex"]
+    bl.close()
+    with pytest.raises(ValueError):
+        ex.data
+    with pytest.raises(ValueError):
+        ex.load()
+    with pytest.raises(ValueError):
+        ex.read((0, 0))
+    with pytest.raises(ValueError):
+        bl["px/electron"]
+    # Metadata is still available
+    assert ex.units == "V/m"
+    assert ex.grid_id == "grid"
+    assert ex.dims == (4, 3)
+
+
+def test_release(closes):
+    with sdfr.read(DATA) as bl:
+        ex = bl["ex"]
+        data = ex.data
+        ex.release()
+        assert ex._data is None
+        assert np.array_equal(data, EX)
+        assert np.array_equal(ex.data, EX)
+        assert ex.data is not data
+    del data, ex
+    gc.collect()
+    assert len(closes) == 1
+
+
+def test_mmap_after_close():
+    with sdfr.read(DATA, mmap=True) as bl:
+        data = bl["ex"].data
+    assert np.array_equal(data, EX)
+
+
+def test_blocklist_identity():
+    with sdfr.read(DATA) as a, sdfr.read(DATA) as b:
+        assert a != b
+        assert len({a, b}) == 2
@@ -0,0 +1,21 @@
+import os
+import shutil
+
+import sdfr
+
+DATA = os.path.join(os.path.dirname(__file__), "data", "0000.sdf")
+
+
+def test_index_skips_partial_dump(tmp_path):
+    shutil.copy(DATA, tmp_path / "0000.sdf")
+    with open(DATA, "rb") as f:
+        contents = f.read()
+    (tmp_path / "0001.sdf").write_bytes(contents[:300])
+
+    with sdfr.RunIndex(tmp_path) as index:
+        assert index.files() == [str(tmp_path / "0000.sdf")]
+
+        (tmp_path / "0001.sdf").write_bytes(contents)
+        index.update()
+        assert sorted(index.files()) == [str(tmp_path / "0000.sdf"),
+                                         str(tmp_path / "0001.sdf")]
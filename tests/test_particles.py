@@ -0,0 +1,65 @@
+import os
+
+import numpy as np
+import pytest
+
+import sdfr
+
+DATA = os.path.join(os.path.dirname(__file__), "data", "0000.sdf")
+
+
+@pytest.fixture
+def bl():
+    with sdfr.read(DATA) as bl:
+        yield bl
+
+
+@pytest.mark.parametrize("y, weights", [
+    ("Px", "Weight"),
+    ("Px_electron", "Weight_electron"),
+    ("Px/electron", "Weight/electron"),
+    ("Particles/Px/electron", "Particles/Weight/electron"),
+])
+def test_histogram_column_names(bl, y, weights):
+    x = bl["Grid/Particles/electron"].data[0]
+    px = bl["Particles/Px/electron"].data
+    w = bl["Particles/Weight/electron"].data
+    hist, xedges, yedges = sdfr.histogram(
+        bl, x="Grid/Particles/electron/x", y=y, bins=4, weights=weights,
+        chunk=7)
+    expected = np.histogram2d(x, px, bins=4, weights=w)
+    assert np.allclose(hist, expected[0])
+    assert np.allclose(xedges, expected[1])
+    assert np.allclose(yedges, expected[2])
+
+
+def test_histogram_short_name_without_species(bl):
+    px = bl["Particles/Px/electron"].data
+    hist, edges = sdfr.histogram(bl, x="Px", bins=5)
+    assert np.array_equal(hist, np.histogram(px, bins=5)[0])
+
+
+def test_histogram_unknown_column(bl):
+    with pytest.raises(KeyError):
+        sdfr.histogram(bl, x="Pz")
+
+
+def test_select(bl):
+    px = bl["Particles/Px/electron"].data
+    result = sdfr.select(bl, "electron", where="(Px > 0) & (Weight < 15)",
+                         columns=["Px", "x"])
+    rows = np.flatnonzero((px > 0) & (np.arange(1, 21) < 15))
+    assert np.array_equal(result["index"], rows)
+    assert np.array_equal(result["Px"], px[rows])
+
+
+def test_select_unknown_column(bl):
+    with pytest.raises(KeyError):
+        sdfr.select(bl, "electron", where="Pz > 0")
+
+
+def test_select_builds_only_particle_blocks():
+    with sdfr.read(DATA) as bl:
+        sdfr.select(bl, "electron", where="Px > 0")
+        sdfr.histogram(bl, x="Px")
+        assert "ex" not in bl._wrappers
@@ -0,0 +1,38 @@
+import os
+import time
+
+import numpy as np
+
+import sdfr
+
+DATA = os.path.join(os.path.dirname(__file__), "data", "0000.sdf")
+
+
+def test_read_many_default():
+    result, = sdfr.read_many([DATA], workers=1)
+    assert "Grid/CPUs/Current rank" not in result
+    assert np.array_equal(result["Electric Field/Ex"],
+                          np.arange(12.).reshape(4, 3, order='F'))
+
+
+def test_iter_files_default():
+    for bl in sdfr.iter_files([DATA, DATA]):
+        assert bl["Electric Field/Ex"]._data is not None
+
+
+def test_iter_files_prefetch_bound(monkeypatch):
+    opened = []
+
+    class CountingBlockList(sdfr.SDF.BlockList):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            opened.append(self)
+
+    monkeypatch.setattr(sdfr.SDF, "BlockList", CountingBlockList)
+    files = sdfr.iter_files([DATA] * 6, prefetch=2)
+    next(files)
+    time.sleep(0.5)
+    # The file held by the caller and at most two read ahead
+    assert len(opened) == 3
+    files.close()
+    assert all(bl.closed for bl in opened[1:])
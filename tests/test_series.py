@@ -0,0 +1,42 @@
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+import sdfr
+
+DATA = os.path.join(os.path.dirname(__file__), "data", "0000.sdf")
+
+
+@pytest.fixture
+def series(tmp_path):
+    for name in ("0001.sdf", "0000.sdf"):
+        shutil.copy(DATA, tmp_path / name)
+    return sdfr.Series(str(tmp_path))
+
+
+def test_series_orders_equal_times_by_name(series, tmp_path):
+    assert series.files == [str(tmp_path / "0000.sdf"),
+                            str(tmp_path / "0001.sdf")]
+
+
+@pytest.mark.parametrize("key", [
+    (Ellipsis, 0), (0, Ellipsis), Ellipsis, (slice(None), 1, Ellipsis),
+    (1,), (), (slice(None, None, -1), slice(1, 3), 2),
+])
+def test_series_indexing(series, key):
+    ex = np.arange(12.).reshape(4, 3, order='F')
+    expected = np.stack([ex, ex])
+    assert np.array_equal(series["ex"][key], expected[key])
+
+
+@pytest.mark.parametrize("key", [None, (Ellipsis, Ellipsis), (0, 0, 0, 0)])
+def test_series_bad_index(series, key):
+    with pytest.raises(IndexError):
+        series["ex"][key]
+
+
+def test_empty_series():
+    with pytest.raises(ValueError):
+        sdfr.Series([])["ex"]
@@ -0,0 +1,55 @@
+import os
+import pickle
+import subprocess
+import sys
+
+import numpy as np
+
+import sdfr
+
+DATA = os.path.join(os.path.dirname(__file__), "data", "0000.sdf")
+EX = np.arange(12.).reshape(4, 3, order='F')
+
+
+def test_share_outlives_blocklist():
+    with sdfr.read(DATA) as bl:
+        shared = bl.share("ex")["ex"]
+    del bl
+    try:
+        assert np.array_equal(shared.attach(), EX)
+    finally:
+        shared.unlink()
+
+
+def test_attach_in_other_process_keeps_segment():
+    with sdfr.read(DATA) as bl:
+        shared = bl.share("ex")["ex"]
+    script = ("import pickle, sys; shared = pickle.loads(sys.stdin.buffer"
+              ".read()); print(shared.attach()[1, 1])")
+    try:
+        result = subprocess.run([sys.executable, "-c", script],
+                                input=pickle.dumps(shared),
+                                capture_output=True, check=True)
+        assert float(result.stdout) == EX[1, 1]
+        assert b"leaked" not in result.stderr
+        shared.detach()
+        assert np.array_equal(shared.attach(), EX)
+    finally:
+        shared.unlink()
+
+
+def test_share_mesh():
+    with sdfr.read(DATA) as bl:
+        mesh = bl["Grid/Particles/electron"]
+        expected = [grid.copy() for grid in mesh.read()]
+        shared = bl.share(["Grid/Particles/electron", "grid"])
+    try:
+        positions = shared["Grid/Particles/electron"]
+        assert len(positions) == 2
+        for block, grid in zip(positions, expected):
+            assert np.array_equal(block.attach(), grid)
+        assert [b.attach().shape for b in shared["grid"]] == [(5,), (4,)]
+    finally:
+        for blocks in shared.values():
+            for block in blocks:
+                block.unlink()
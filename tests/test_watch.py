@@ -0,0 +1,45 @@
+import importlib
+import os
+import threading
+import time
+
+import pytest
+
+import sdfr
+
+_watch = importlib.import_module("sdfr.watch")
+
+DATA = os.path.join(os.path.dirname(__file__), "data", "0000.sdf")
+
+
+def _write_with_pause(path, split, pause):
+    """Copies the test file, pausing after the first ``split`` bytes"""
+    with open(DATA, "rb") as f:
+        contents = f.read()
+    with open(path, "wb") as f:
+        f.write(contents[:split])
+        f.flush()
+        time.sleep(pause)
+        f.write(contents[split:])
+
+
+@pytest.mark.parametrize("inotify", [True, False])
+@pytest.mark.parametrize("split", [100, 2000, -10])
+def test_watch_waits_for_paused_writer(tmp_path, monkeypatch, inotify,
+                                       split):
+    if not inotify:
+        monkeypatch.setattr(_watch, "_inotify_open", lambda directory: None)
+    size = os.path.getsize(DATA)
+    path = tmp_path / "0001.sdf"
+    # Start writing once the watch is running
+    writer = threading.Timer(0.3, _write_with_pause,
+                             args=(path, split % size, 2.0))
+    writer.start()
+    found = []
+    try:
+        for dump in sdfr.watch(tmp_path, interval=0.2, timeout=5.0):
+            found.append((dump, os.path.getsize(dump)))
+            break
+    finally:
+        writer.join()
+    assert found == [(str(path), size)]